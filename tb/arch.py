@@ -1,5 +1,29 @@
+from array import array
 from dataclasses import dataclass
-from typing import Dict, List
+from numbers import Integral
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from riscv_disassembler import ControlFlow
+
+if TYPE_CHECKING:
+    import numpy as np
+    from cache import RegisterHistory
+
+# Control-flow classes raising is_ind_jump_i
+INDIRECT_JUMPS: Tuple[ControlFlow, ...] = (
+    ControlFlow.INDIRECT_JUMP,
+    ControlFlow.INDIRECT_CALL,
+)
 
 
 # Register ABI names mapped to integer numbers
@@ -38,41 +62,204 @@ regmap: Dict[str, int] = {
     "t6": 31,
 }
 
+# Register ABI names by number
+abi_names: List[str] = list(regmap)
 
-@dataclass
+
+# Number of general-purpose registers
+GPR_COUNT: int = 32
+
+
+class RegisterFile:
+    """General-purpose registers of the hart, as integers indexed by number.
+
+    A snapshot shares the registers of the file it is taken from until either
+    of them is written, which then copies them (copy-on-write). Taking a
+    snapshot per instruction thus costs one copy of 32 registers per
+    instruction writing a register, and snapshots never change afterwards.
+
+    """
+
+    __slots__ = ("_regs", "_shared")
+
+    def __init__(self, regs: Optional[Iterable[int]] = None) -> None:
+        self._regs: array = array("Q", regs if regs is not None else [0] * GPR_COUNT)
+        self._shared: bool = False
+
+        if len(self._regs) != GPR_COUNT:
+            raise ValueError(f"Expected {GPR_COUNT} registers, got {len(self._regs)}")
+
+    def __getitem__(self, register: int) -> int:
+        return self._regs[register]
+
+    def __setitem__(self, register: int, value: int) -> None:
+        # x0 is hardwired to zero
+        if not register:
+            return
+        if self._shared:
+            self._regs = array("Q", self._regs)
+            self._shared = False
+        self._regs[register] = value
+
+    def __len__(self) -> int:
+        return GPR_COUNT
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._regs)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RegisterFile):
+            return NotImplemented
+        return self._regs == other._regs
+
+    def __repr__(self) -> str:
+        written: str = ", ".join(f"{r}={v:#x}" for r, v in self.items() if v)
+        return f"RegisterFile({written})"
+
+    def snapshot(self) -> "RegisterFile":
+        """Frozen copy of the registers, shared until either file is written"""
+
+        snapshot: RegisterFile = RegisterFile.__new__(RegisterFile)
+        snapshot._regs = self._regs
+        snapshot._shared = self._shared = True
+        return snapshot
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """ABI name and value of every register"""
+        return zip(abi_names, self._regs)
+
+
+@dataclass(slots=True)
 class Instruction:
     pc: int
     next_pc: int
-    instr: str
-    rd: str
-    rs1: str
-    rs2: str
-    rf: Dict[str, int]
+    text: str
+    rd: int
+    rs1: int
+    rs2: int
+    rf: RegisterFile
+    cflow: ControlFlow = ControlFlow.NONE
+    target: Optional[int] = None
+
+    @property
+    def instr(self) -> str:
+        """Disassembly of the instruction, see riscv_disassembler.dsm"""
+        if self.target is None:
+            return self.text
+        return f"{self.text}{self.pc + self.target:x}"
 
     def is_jr(self) -> int:
-        if ("jalr" in self.instr or "jr" in self.instr) and self.rs1 != 1:
-            return 1
-        return 0
+        """Whether the instruction is an indirect jump, other than a return"""
+        return int(self.cflow in INDIRECT_JUMPS)
 
     def __str__(self) -> str:
         return f"{self.pc:#x}    {self.instr}    rd = {self.rd}    rs1 = {self.rs1}    rs2 = {self.rs2}"
 
 
+# Columns of a TraceTable, one value per instruction
+TRACE_COLUMNS: Tuple[str, ...] = (
+    "pc",
+    "next_pc",
+    "word",
+    "cflow",
+    "rd",
+    "rs1",
+    "rs2",
+    "text",
+    "entry",
+)
+
+
+@dataclass(eq=False)
+class TraceTable:
+    """Executed instructions of a trace, stored as one numpy array per field.
+
+    Row k holds the k-th instruction of the table and entry[k] its number in
+    the trace. text indexes texts, the disassemblies of the trace. Slicing a
+    table returns views of its columns, without copy, and indexing it with a
+    boolean mask returns the rows where the mask is set.
+
+    Register files are only read from the history of the trace, if any, when
+    a row is read as an Instruction.
+
+    This requires numpy, which is only imported by the methods that need it.
+
+    """
+
+    pc: "np.ndarray"
+    next_pc: "np.ndarray"
+    word: "np.ndarray"
+    cflow: "np.ndarray"
+    rd: "np.ndarray"
+    rs1: "np.ndarray"
+    rs2: "np.ndarray"
+    text: "np.ndarray"
+    entry: "np.ndarray"
+    texts: List[str]
+    history: Optional[Callable[[], "RegisterHistory"]] = None
+
+    def __len__(self) -> int:
+        return len(self.pc)
+
+    def __getitem__(
+        self, key: Union[int, slice, "np.ndarray"]
+    ) -> Union[Instruction, "TraceTable"]:
+        if isinstance(key, Integral):
+            return self.instruction(int(key))
+
+        return TraceTable(
+            **{name: getattr(self, name)[key] for name in TRACE_COLUMNS},
+            texts=self.texts,
+            history=self.history,
+        )
+
+    def instruction(self, row: int) -> Instruction:
+        """Row of the table as an Instruction"""
+
+        rf: RegisterFile = (
+            self.history().after(int(self.entry[row]))
+            if self.history is not None
+            else RegisterFile()
+        )
+
+        return Instruction(
+            pc=int(self.pc[row]),
+            next_pc=int(self.next_pc[row]),
+            text=self.texts[self.text[row]],
+            rd=int(self.rd[row]),
+            rs1=int(self.rs1[row]),
+            rs2=int(self.rs2[row]),
+            rf=rf,
+            cflow=ControlFlow(self.cflow[row]),
+        )
+
+    def is_cflow(self, *cflows: ControlFlow) -> "np.ndarray":
+        """Mask of the instructions of the given control-flow classes"""
+        import numpy as np
+
+        return np.isin(self.cflow, np.array(cflows, dtype=self.cflow.dtype))
+
+    @property
+    def is_indirect_jump(self) -> "np.ndarray":
+        """Mask of the instructions raising is_ind_jump_i, see Instruction.is_jr"""
+        return self.is_cflow(*INDIRECT_JUMPS)
+
+
 @dataclass
 class Application:
     name: str
-    instructions: List[Instruction]
+    instructions: TraceTable
     cycles: int
 
 
-def write_rf(rf: Dict[str, int], register: str, value: int) -> None:
-    """Update register file"""
-    rf[register] = value
+def write_rf(rf: RegisterFile, register: str, value: int) -> None:
+    """Update register file, ignoring registers other than GPRs"""
+    idx: Optional[int] = regmap.get(register)
+    if idx is not None:
+        rf[idx] = value
 
 
-def read_rf(rf: Dict[str, int], register: str) -> int:
-    """Read register file"""
-    try:
-        return rf[register]
-    except KeyError:
-        return 0
+def read_rf(rf: RegisterFile, register: str) -> int:
+    """Read register file, registers other than GPRs reading as zero"""
+    idx: Optional[int] = regmap.get(register)
+    return 0 if idx is None else rf[idx]
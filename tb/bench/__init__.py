@@ -0,0 +1,6 @@
+"""Benchmarks of the testbench hot paths.
+
+Each module is runnable from the tb directory, e.g.:
+
+>>> python -m bench.spike_log --lines 4000000
+"""
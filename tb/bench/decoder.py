@@ -0,0 +1,111 @@
+"""Differential check of the flat decode table against the table walkers.
+
+Every instruction word found in the Spike logs of the benchmarks is decoded
+with riscv_instructions_parser.lookup_instruction and with get_instruction,
+get_c_instruction and get_fdq_instruction, which must agree.
+"""
+
+import argparse
+import glob
+import os
+import sys
+from typing import Iterator, List, Optional, Set, Tuple
+
+from riscv_disassembler.riscv_instructions_parser import (
+    get_c_instruction,
+    get_fdq_instruction,
+    get_instruction,
+    get_opcode,
+    lookup_instruction,
+)
+from riscv_disassembler.riscv_instructions_table import (
+    C_OPCODES,
+    FDQ_OPCODES,
+    INSTR_FORMAT_BY_OPC,
+)
+from vendor.spike_log_to_trace_csv import read_spike_trace_mmap
+
+sw_dir: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "sw"))
+
+
+def walk_instruction(instruction: int) -> Optional[Tuple[str, str]]:
+    """Mnemonic and format of an instruction, found by walking the tables"""
+
+    opcode: Optional[int] = get_opcode(instruction)
+
+    if opcode not in INSTR_FORMAT_BY_OPC or opcode is None:
+        return None
+
+    if opcode in C_OPCODES:
+        return get_c_instruction(instruction, opcode)
+
+    if opcode in FDQ_OPCODES:
+        mnemonic: Optional[str] = get_fdq_instruction(instruction, opcode)
+        return None if mnemonic is None else (mnemonic, "FDQ")
+
+    mnemonic = get_instruction(instruction, opcode)
+    return None if mnemonic is None else (mnemonic, INSTR_FORMAT_BY_OPC[opcode])
+
+
+def get_words(logs: List[str]) -> Iterator[int]:
+    """Distinct instruction words of Spike logs"""
+
+    seen: Set[int] = set()
+    for log in logs:
+        for entry, _ in read_spike_trace_mmap(log, 0, lean=True):
+            word: int = int(entry.binary, 16)
+            if word not in seen:
+                seen.add(word)
+                yield word
+
+
+def check(words: Iterator[int]) -> int:
+    """Compare both decoders on words, returning the number of mismatches"""
+
+    count: int = 0
+    mismatches: int = 0
+    for word in words:
+        count += 1
+        expected = walk_instruction(word)
+        decoded = lookup_instruction(word)
+        if decoded != expected:
+            mismatches += 1
+            print(f"{word:#010x}: table {decoded}, walk {expected}")
+
+    print(f"{count} instruction words, {mismatches} mismatches")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "logs", nargs="*", help="Spike logs, those of sw/build if omitted"
+    )
+    parser.add_argument(
+        "--compressed",
+        action="store_true",
+        help="also check every 16-bit instruction word",
+    )
+    args = parser.parse_args()
+
+    logs: List[str] = args.logs or sorted(
+        glob.glob(os.path.join(sw_dir, "build", "*", "*.riscv.log*"))
+    )
+    logs = [log for log in logs if not log.endswith((".cache", ".index"))]
+
+    if not logs and not args.compressed:
+        print(f"No Spike log found, run make -C {sw_dir} first")
+        sys.exit(1)
+
+    for log in logs:
+        print(log)
+
+    words: Iterator[int] = get_words(logs)
+    if args.compressed:
+        words = iter({*words, *range(0x10000)})
+
+    sys.exit(1 if check(words) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Throughput of the disassembler, in instructions per second.
+
+disassemble is measured on a mix of instructions, either the code of the
+benchmarks built in sw/build or the synthetic program, and on random
+compressed, floating-point, atomic and CSR instructions. Each set is decoded
+cold, after clearing the decode cache, then warm; compressed instructions are
+always read from the table of every 16-bit word. Results can be saved as a
+baseline and compared with a later run.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench.synthetic import PROGRAM
+from image import read_elf_words
+from riscv_disassembler import decode_cache_clear, disassemble
+from riscv_disassembler.riscv_disassembler import get_compressed_table
+from riscv_disassembler.riscv_instructions_parser import lookup_instruction
+from riscv_disassembler.riscv_instructions_table import CSR_ADDR
+
+sw_dir: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "sw"))
+
+# Relative slowdown reported as a regression against the baseline
+TOLERANCE: float = 0.1
+
+
+def random_words(
+    rand: random.Random, count: int, make: Callable[[random.Random], int]
+) -> List[int]:
+    """count words drawn with make among those decoded by the disassembler"""
+
+    words: List[int] = []
+    while len(words) < count:
+        word: int = make(rand)
+        if lookup_instruction(word) is not None:
+            words.append(word)
+    return words
+
+
+def make_compressed(rand: random.Random) -> int:
+    return rand.getrandbits(14) << 2 | rand.randrange(3)
+
+
+def make_fp(rand: random.Random) -> int:
+    opcode: int = rand.choice([0x7, 0x27, 0x43, 0x47, 0x4B, 0x4F, 0x53, 0x53, 0x53])
+    return rand.getrandbits(25) << 7 | opcode
+
+
+def make_atomic(rand: random.Random) -> int:
+    funct3: int = rand.choice([2, 3])
+    return rand.getrandbits(17) << 15 | funct3 << 12 | rand.getrandbits(5) << 7 | 0x2F
+
+
+def make_csr(rand: random.Random) -> int:
+    funct3: int = rand.choice([1, 2, 3, 5, 6, 7])
+    csr: int = rand.choice(list(CSR_ADDR))
+    return (
+        csr << 20
+        | rand.getrandbits(5) << 15
+        | funct3 << 12
+        | rand.getrandbits(5) << 7
+        | 0x73
+    )
+
+
+def get_mix(rand: random.Random, count: int) -> Tuple[str, List[int]]:
+    """Instructions of the benchmarks built in sw/build, else of PROGRAM"""
+
+    words: List[int] = []
+    for elf in sorted(glob.glob(os.path.join(sw_dir, "build", "*", "*.riscv"))):
+        words.extend(w for w in read_elf_words(elf).values() if lookup_instruction(w))
+
+    if words:
+        return "benchmarks", [rand.choice(words) for _ in range(count)]
+
+    return "synthetic", [rand.choice(PROGRAM)[0] for _ in range(count)]
+
+
+def measure(words: List[int], pcs: List[int], repeat: int) -> Tuple[float, float]:
+    """Cold and warm throughput of disassemble on words"""
+
+    # Built once per process, out of the measure
+    get_compressed_table()
+
+    cold: float = 0.0
+    warm: float = 0.0
+    for _ in range(repeat):
+        decode_cache_clear()
+        for rate in ("cold", "warm"):
+            start: float = time.perf_counter()
+            for word, pc in zip(words, pcs):
+                disassemble(word, pc)
+            speed: float = len(words) / (time.perf_counter() - start)
+            if rate == "cold":
+                cold = max(cold, speed)
+            else:
+                warm = max(warm, speed)
+
+    return cold, warm
+
+
+def bench(count: int, repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    rand: random.Random = random.Random(seed)
+
+    mix_name, mix = get_mix(rand, count)
+    sets: Dict[str, List[int]] = {
+        f"mix ({mix_name})": mix,
+        "compressed": random_words(rand, count, make_compressed),
+        "fp": random_words(rand, count, make_fp),
+        "atomic": random_words(rand, count, make_atomic),
+        "csr": random_words(rand, count, make_csr),
+    }
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, words in sets.items():
+        pcs: List[int] = [0x80000000 + 2 * rand.getrandbits(16) for _ in words]
+        cold, warm = measure(words, pcs, repeat)
+        results[name] = {"cold": cold, "warm": warm}
+        print(f"{name:>20}: {cold:12,.0f} instr/s cold {warm:12,.0f} instr/s warm")
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: str) -> bool:
+    """Print the speedup against a baseline, returning False on a regression"""
+
+    with open(baseline, "r") as f:
+        reference: Dict[str, Dict[str, float]] = json.load(f)
+
+    ok: bool = True
+    for name, rates in results.items():
+        for rate, speed in rates.items():
+            ref: Optional[float] = reference.get(name, {}).get(rate)
+            if not ref:
+                continue
+            ratio: float = speed / ref
+            regression: bool = ratio < 1 - TOLERANCE
+            ok &= not regression
+            flag: str = " REGRESSION" if regression else ""
+            print(f"{name:>20}: {rate} x{ratio:.2f}{flag}")
+
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=str, help="write the results to a file")
+    parser.add_argument("--baseline", type=str, help="compare with saved results")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = bench(args.count, args.repeat, args.seed)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and not compare(results, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Correctness of the disassembler against objdump.
+
+Every instruction of the golden dumps of the benchmarks listed in
+sw/sources.mk, built with make -C sw golden bmark=<name>, is disassembled and
+its mnemonic and register operands are compared with the ones of objdump.
+Golden dumps are written without pseudo-instructions and with numeric
+register names, so that both disassemblies can be compared directly.
+"""
+
+import argparse
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from riscv_disassembler import disassemble, dsm
+
+sw_dir: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "sw"))
+
+# Instruction lines of objdump -d output, with their mnemonic and operands
+DUMP_RE = re.compile(
+    r"^\s*([0-9a-f]+):\s+([0-9a-f]{4}|[0-9a-f]{8})\s+(\S+)[ \t]*([^<\n]*)"
+)
+REG_RE = re.compile(r"\b[xf](\d+)\b")
+
+
+def get_bmarks() -> List[str]:
+    """Benchmarks listed in sw/sources.mk"""
+
+    with open(os.path.join(sw_dir, "sources.mk"), "r") as f:
+        sources: str = f.read()
+
+    match = re.search(r"__bmarks\s*=((?:.*\\\n)*.*)", sources)
+    return match.group(1).replace("\\", " ").split() if match else []
+
+
+def get_registers(operands: str) -> List[int]:
+    return [int(r) for r in REG_RE.findall(operands)]
+
+
+def check_dump(path: str, errors: Counter, examples: Dict[str, str]) -> int:
+    """Compare the disassembler with a golden dump, returning its size"""
+
+    count: int = 0
+
+    with open(path, "r") as f:
+        for line in f:
+            match = DUMP_RE.match(line)
+            if not match:
+                continue
+
+            count += 1
+            pc, word = int(match.group(1), 16), int(match.group(2), 16)
+            mnemonic, operands = match.group(3), match.group(4).strip()
+
+            disassembled: Optional[dsm] = disassemble(word, pc)
+            error: Optional[str] = None
+
+            if disassembled is None:
+                error = "unsupported"
+            else:
+                fields: List[str] = disassembled.instr.split(maxsplit=1)
+                if fields[0] != mnemonic:
+                    error = "mnemonic"
+                elif get_registers(fields[-1] if len(fields) > 1 else "") != (
+                    get_registers(operands)
+                ):
+                    error = "registers"
+
+            if error is not None:
+                key: str = f"{mnemonic} ({error})"
+                errors[key] += 1
+                examples.setdefault(
+                    key,
+                    f"{pc:#x}: {word:#x} {mnemonic} {operands} -> "
+                    f"{disassembled.instr if disassembled else None}",
+                )
+
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "dumps", nargs="*", help="golden dumps, those of sw/sources.mk if omitted"
+    )
+    args = parser.parse_args()
+
+    dumps: List[str] = args.dumps
+    if not dumps:
+        for bmark in get_bmarks():
+            dump: str = os.path.join(
+                sw_dir, "build", bmark, f"{bmark}.riscv.golden.dump"
+            )
+            if os.path.isfile(dump):
+                dumps.append(dump)
+            else:
+                print(f"{bmark}: no golden dump, run make -C sw golden bmark={bmark}")
+
+    errors: Counter = Counter()
+    examples: Dict[str, str] = {}
+    total: int = 0
+
+    for dump in dumps:
+        count: int = check_dump(dump, errors, examples)
+        total += count
+        print(f"{dump}: {count} instructions")
+
+    for key, count in errors.most_common():
+        print(f"{count:8} {key:<30} e.g. {examples[key]}")
+
+    mismatches: int = sum(errors.values())
+    print(f"{total} instructions, {mismatches} mismatches")
+
+    sys.exit(1 if mismatches or not total else 0)
+
+
+if __name__ == "__main__":
+    main()
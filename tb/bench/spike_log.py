@@ -0,0 +1,59 @@
+"""Throughput of the Spike log readers, in lines per second."""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Iterator
+
+from bench.synthetic import write_spike_log
+from vendor.spike_log_to_trace_csv import read_spike_trace, read_spike_trace_mmap
+
+READERS: Dict[str, Callable[[str], Iterator]] = {
+    "full": lambda path: read_spike_trace(path, 1),
+    "lean": lambda path: read_spike_trace(path, 0, lean=True),
+    "mmap": lambda path: read_spike_trace_mmap(path, 1),
+    "mmap-lean": lambda path: read_spike_trace_mmap(path, 0, lean=True),
+}
+
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def bench(path: str, repeat: int) -> None:
+    lines: int = count_lines(path)
+    print(f"{path}: {lines} lines")
+
+    for name, reader in READERS.items():
+        best: float = float("inf")
+        for _ in range(repeat):
+            start: float = time.perf_counter()
+            for _ in reader(path):
+                pass
+            best = min(best, time.perf_counter() - start)
+
+        print(f"{name:>8}: {best:8.2f} s {lines / best:12,.0f} lines/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--log", type=str, help="Spike log, synthetic if omitted")
+    parser.add_argument("--lines", type=int, default=4_000_000)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.log:
+        bench(args.log, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path: str = os.path.join(tmp, "synthetic.riscv.log")
+        # Each instruction takes two lines: the instruction and its commit
+        write_spike_log(path, args.lines // 2)
+        bench(path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Parameter sweep of jop_alarm on its reference model.
+
+The first instruction raising the alarm is computed for every combination of
+the parameters swept by tb/entry.py, or of the values given on the command
+line, on the traces of the benchmarks selected by ASPYCOT_BMARKS and
+ASPYCOT_RANGE. With --check, the vectorized model is compared with the
+cycle-by-cycle one.
+"""
+
+import argparse
+import sys
+import time
+from parser import get_app_range, get_app_table, get_apps_path
+from typing import Dict, List, Optional
+
+from arch import TraceTable
+from entry import JOP_ALARM_PARAMETERS
+from golden import jop_alarm_first_alarm, jop_alarm_first_alarms
+from runner import get_parameter_sets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    for name, default in JOP_ALARM_PARAMETERS.items():
+        parser.add_argument(
+            f"--{name}", type=int, nargs="+", default=default, metavar="VALUE"
+        )
+    parser.add_argument(
+        "--check", action="store_true", help="cross-check with the cycle model"
+    )
+    args = parser.parse_args()
+
+    grid: List[Dict[str, int]] = get_parameter_sets(
+        {name: getattr(args, name) for name in JOP_ALARM_PARAMETERS}
+    )
+    start, end = get_app_range()
+    mismatches: int = 0
+
+    for app, path in get_apps_path().items():
+        table: TraceTable = get_app_table(path, start, end)
+
+        begin: float = time.perf_counter()
+        alarms: List[Optional[int]] = jop_alarm_first_alarms(
+            table.is_indirect_jump, grid
+        )
+        elapsed: float = time.perf_counter() - begin
+
+        print(
+            f"{app}: {len(table)} instructions, {len(grid)} parameter sets "
+            f"in {elapsed:.3f} s"
+        )
+
+        for parameters, alarm in zip(grid, alarms):
+            values: str = " ".join(f"{k}={v}" for k, v in parameters.items())
+            first: str = "none" if alarm is None else str(start + alarm)
+
+            if args.check:
+                expected: Optional[int] = jop_alarm_first_alarm(
+                    table.is_indirect_jump, parameters
+                )
+                if expected != alarm:
+                    mismatches += 1
+                    first += f" MISMATCH, expected {expected}"
+
+            print(f"  {values}: first alarm at instruction {first}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
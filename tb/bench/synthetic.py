@@ -0,0 +1,55 @@
+"""Generation of synthetic Spike logs for benchmarks."""
+
+import random
+from typing import List, Optional, Tuple
+
+# (binary, Spike disassembly, committed register) of the generated instructions
+PROGRAM: List[Tuple[int, str, Optional[str]]] = [
+    (0x00000297, "auipc   t0, 0x0", "x5"),
+    (0x02028593, "addi    a1, t0, 32", "x11"),
+    (0x4501, "c.li    a0, 0", "x10"),
+    (0x0505, "c.addi  a0, 1", "x10"),
+    (0x00A5B023, "sd      a0, 0(a1)", "mem"),
+    (0x0005B503, "ld      a0, 0(a1)", "x10"),
+    (0x00B50463, "beq     a0, a1, pc + 8", None),
+    (0x30529073, "csrw    mtvec, t0", "c773_mtvec"),
+    (0xF1402573, "csrr    a0, mhartid", "x10"),
+    (0x000780E7, "jalr    a5", "x1"),
+    (0x00078067, "jr      a5", None),
+    (0x8782, "c.jr    a5", None),
+    (0x9782, "c.jalr  a5", "x1"),
+    (0x8082, "ret", None),
+    (0x008000EF, "jal     pc + 0x8", "x1"),
+    (0xA001, "c.j     pc + 0", None),
+    (0xFC448493, "addi    s1, s1, -60", "x9"),
+    (0xC119, "c.beqz  a0, pc + 6", None),
+]
+
+
+def write_spike_log(path: str, count: int, seed: int = 0) -> None:
+    """Write a log of count instructions as Spike -l --log-commits would"""
+
+    rand: random.Random = random.Random(seed)
+    pc: int = 0x80000000
+
+    with open(path, "w") as f:
+        for _ in range(count):
+            binary, disasm, reg = PROGRAM[rand.randrange(len(PROGRAM))]
+            compressed: bool = binary & 0x3 != 0x3
+            word: str = f"{binary:04x}" if compressed else f"{binary:08x}"
+            prefix: str = f"core   0: 3 0x{pc:016x} (0x{word})"
+
+            f.write(f"core   0: 0x{pc:016x} (0x{word}) {disasm}\n")
+
+            if reg == "mem":
+                value: int = rand.getrandbits(64)
+                f.write(f"{prefix} mem 0x{0x80001000:016x} 0x{value:016x}\n")
+            elif reg is not None:
+                f.write(f"{prefix} {reg:<3} 0x{rand.getrandbits(64):016x}\n")
+            else:
+                f.write(f"{prefix}\n")
+
+            pc += 2 if compressed else 4
+
+        f.write(f"core   0: 0x{pc:016x} (0x00000073) ecall\n")
+        f.write(f"core   0: exception trap_user_ecall, epc 0x{pc:016x}\n")
@@ -0,0 +1,440 @@
+"""Persistent columnar cache of decoded Spike traces.
+
+The cache is written next to the Spike log it was built from and stores one
+column per decoded field, so that a log is parsed and disassembled once per
+build instead of once per test.
+"""
+
+import array
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from arch import GPR_COUNT, Instruction, RegisterFile, TraceTable, regmap
+from riscv_disassembler import ControlFlow, dsm
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_logger: logging.Logger = logging.getLogger("aspycot.cache")
+
+MAGIC: bytes = b"ASPYCOT\x01"
+VERSION: int = 3
+
+# Number of bytes hashed at both ends of a log to fingerprint it
+FINGERPRINT_SIZE: int = 1 << 20
+
+# Number of trace entries between two register file checkpoints
+CHECKPOINT_INTERVAL: int = 1024
+
+# Columns holding one value per trace entry, with their array typecode
+ENTRY_COLUMNS: Dict[str, str] = {
+    "pc": "Q",
+    "word": "I",
+    "rd": "B",
+    "rs1": "B",
+    "rs2": "B",
+    "cflow": "B",
+    "text": "I",
+    "gpr_end": "Q",
+}
+
+# Columns holding one value per GPR commit, by register number
+GPR_COLUMNS: Dict[str, str] = {
+    "gpr_reg": "B",
+    "gpr_val": "Q",
+}
+
+# Column of the register file checkpoints of RegisterHistory, written along
+# the trace so that loading a cache does not replay its commits
+CHECKPOINT_COLUMN: Tuple[str, str] = ("checkpoints", "Q")
+
+Key = Dict[str, Union[int, str]]
+
+
+def get_cache_path(log: str) -> str:
+    """Path of the cache associated to a Spike log"""
+    return f"{log}.cache"
+
+
+def fingerprint(log: str) -> Key:
+    """Identify a Spike log by its size, modification time and a sampled hash"""
+
+    stat: os.stat_result = os.stat(log)
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(log, "rb") as f:
+        digest.update(f.read(FINGERPRINT_SIZE))
+        if stat.st_size > FINGERPRINT_SIZE:
+            f.seek(max(FINGERPRINT_SIZE, stat.st_size - FINGERPRINT_SIZE))
+            digest.update(f.read())
+
+    return {
+        "version": VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": digest.hexdigest(),
+    }
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class RegisterHistory:
+    """Register file at any entry of a trace, from its GPR commits.
+
+    The full register file is checkpointed every interval entries. The one
+    before entry k is rebuilt from the closest checkpoint before k and the
+    commits of at most interval - 1 entries, so that a query costs the same
+    anywhere in the trace and no register file is stored per entry.
+
+    """
+
+    def __init__(
+        self,
+        gpr_end: Sequence[int],
+        gpr_reg: Sequence[int],
+        gpr_val: Sequence[int],
+        interval: int = CHECKPOINT_INTERVAL,
+        checkpoints: Optional[Sequence[int]] = None,
+    ) -> None:
+        self.gpr_end: Sequence[int] = gpr_end
+        self.gpr_reg: Sequence[int] = gpr_reg
+        self.gpr_val: Sequence[int] = gpr_val
+        self.interval: int = interval
+
+        # Checkpoint i holds the GPRs before entry i * interval, flattened
+        self.checkpoints: Sequence[int] = array.array("Q")
+
+        if checkpoints is not None:
+            self.checkpoints = checkpoints
+            return
+
+        rf: RegisterFile = RegisterFile()
+        commit: int = 0
+        for entry in range(0, len(gpr_end), interval):
+            self.checkpoints.extend(rf)
+            stop: int = gpr_end[min(entry + interval, len(gpr_end)) - 1]
+            for i in range(commit, stop):
+                rf[gpr_reg[i]] = gpr_val[i]
+            commit = stop
+
+    def __len__(self) -> int:
+        return len(self.gpr_end)
+
+    @staticmethod
+    def checkpoint_count(entries: int, interval: int = CHECKPOINT_INTERVAL) -> int:
+        """Number of checkpoints of the history of entries"""
+        return -(-entries // interval)
+
+    def before(self, entry: int) -> RegisterFile:
+        """GPRs holding the commits of the entries before entry"""
+
+        if not 0 <= entry <= len(self):
+            raise IndexError(f"Entry {entry} out of trace of {len(self)} entries")
+
+        checkpoint: int = min(
+            entry // self.interval, len(self.checkpoints) // GPR_COUNT - 1
+        )
+        if checkpoint < 0:
+            return RegisterFile()
+
+        first: int = checkpoint * self.interval
+        rf: RegisterFile = RegisterFile(
+            self.checkpoints[GPR_COUNT * checkpoint : GPR_COUNT * (checkpoint + 1)]
+        )
+
+        gpr_reg = self.gpr_reg
+        gpr_val = self.gpr_val
+        start: int = self.gpr_end[first - 1] if first else 0
+        stop: int = self.gpr_end[entry - 1] if entry else 0
+        for i in range(start, stop):
+            rf[gpr_reg[i]] = gpr_val[i]
+
+        return rf
+
+    def after(self, entry: int) -> RegisterFile:
+        """GPRs once entry has executed, as Instruction.rf"""
+        return self.before(entry + 1)
+
+
+class TraceCache:
+    """Decoded trace stored as columns.
+
+    Entry ``k`` of the trace holds the program counter, binary word, decoded
+    registers, control-flow class and disassembly index of the k-th executed
+    instruction. Its GPR commits are ``gpr_reg``/``gpr_val`` in the range
+    ``[gpr_end[k - 1], gpr_end[k])``.
+    """
+
+    def __init__(
+        self,
+        columns: Optional[Dict[str, Sequence[int]]] = None,
+        texts: Optional[List[str]] = None,
+    ) -> None:
+        if columns is None:
+            columns = {
+                name: array.array(typecode)
+                for name, typecode in {**ENTRY_COLUMNS, **GPR_COLUMNS}.items()
+            }
+
+        # Checkpoints of a trace loaded from its cache, see history
+        self._checkpoints: Optional[Sequence[int]] = columns.pop(
+            CHECKPOINT_COLUMN[0], None
+        )
+
+        self.columns: Dict[str, Sequence[int]] = columns
+        self.texts: List[str] = texts if texts is not None else []
+
+        self._text_ids: Dict[str, int] = {t: i for i, t in enumerate(self.texts)}
+        self._history: Optional[RegisterHistory] = None
+
+    def __len__(self) -> int:
+        return len(self.columns["pc"])
+
+    def append(self, pc: int, word: int, disassembled: dsm, gpr: List[str]) -> None:
+        """Append a decoded entry and its GPR commits"""
+
+        columns = self.columns
+
+        text: Optional[int] = self._text_ids.get(disassembled.instr)
+        if text is None:
+            text = self._text_ids[disassembled.instr] = len(self.texts)
+            self.texts.append(disassembled.instr)
+
+        for g in gpr:
+            reg, val = g.split(":")
+            idx: Optional[int] = regmap.get(reg)
+            if idx is None:
+                continue
+            columns["gpr_reg"].append(idx)
+            columns["gpr_val"].append(int(val, 16))
+
+        columns["pc"].append(pc)
+        columns["word"].append(word)
+        columns["rd"].append(disassembled.rd)
+        columns["rs1"].append(disassembled.rs1)
+        columns["rs2"].append(disassembled.rs2)
+        columns["cflow"].append(disassembled.cflow)
+        columns["text"].append(text)
+        columns["gpr_end"].append(len(columns["gpr_reg"]))
+
+    def extend(self, other: "TraceCache") -> None:
+        """Append the entries of a trace decoded from the rest of the log.
+
+        Both traces only hold GPR commits, so concatenating them yields the
+        exact register file history of the whole log.
+
+        """
+
+        columns = self.columns
+        gpr_start: int = len(columns["gpr_reg"])
+
+        texts: List[int] = []
+        for t in other.texts:
+            if t not in self._text_ids:
+                self._text_ids[t] = len(self.texts)
+                self.texts.append(t)
+            texts.append(self._text_ids[t])
+
+        for name in ("pc", "word", "rd", "rs1", "rs2", "cflow", "gpr_reg", "gpr_val"):
+            columns[name].extend(other.columns[name])
+        columns["text"].extend(texts[t] for t in other.columns["text"])
+        columns["gpr_end"].extend(gpr_start + e for e in other.columns["gpr_end"])
+
+    def history(self) -> RegisterHistory:
+        """Register file history of the trace.
+
+        The checkpoints are read from the cache file the trace was loaded
+        from, or built on the first call by replaying the whole trace.
+
+        """
+
+        if self._history is not None and len(self._history) == len(self):
+            return self._history
+
+        checkpoints: Optional[Sequence[int]] = self._checkpoints
+        if checkpoints is not None and len(checkpoints) != (
+            GPR_COUNT * RegisterHistory.checkpoint_count(len(self))
+        ):
+            checkpoints = None
+
+        self._history = RegisterHistory(
+            self.columns["gpr_end"],
+            self.columns["gpr_reg"],
+            self.columns["gpr_val"],
+            checkpoints=checkpoints,
+        )
+        return self._history
+
+    def instructions(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        rf: Optional[RegisterFile] = None,
+        first: int = 0,
+    ) -> Iterator[Tuple[Instruction, int]]:
+        """Replay the trace as parser.get_app_instr does from a Spike log.
+
+        Only instructions in the [start, end) range are yielded. The replay
+        starts at entry first <= start, rf holding the GPR commits of the
+        entries before it. Instructions hold snapshots of rf, see
+        arch.RegisterFile.
+
+        """
+
+        pc = self.columns["pc"]
+        rd = self.columns["rd"]
+        rs1 = self.columns["rs1"]
+        rs2 = self.columns["rs2"]
+        cflow = self.columns["cflow"]
+        text = self.columns["text"]
+        gpr_end = self.columns["gpr_end"]
+        gpr_reg = self.columns["gpr_reg"]
+        gpr_val = self.columns["gpr_val"]
+        texts = self.texts
+
+        if rf is None:
+            rf = RegisterFile()
+
+        stop: int = len(self) if end is None else min(len(self), end + 1)
+        commit: int = gpr_end[first - 1] if first else 0
+
+        for k in range(first, stop):
+            if k > start:
+                yield Instruction(
+                    pc=pc[k - 1],
+                    next_pc=pc[k],
+                    text=texts[text[k - 1]],
+                    rd=rd[k - 1],
+                    rs1=rs1[k - 1],
+                    rs2=rs2[k - 1],
+                    rf=rf.snapshot(),
+                    cflow=ControlFlow(cflow[k - 1]),
+                ), k + 1
+
+            for i in range(commit, gpr_end[k]):
+                rf[gpr_reg[i]] = gpr_val[i]
+            commit = gpr_end[k]
+
+    def table(self, start: int = 0, end: Optional[int] = None) -> TraceTable:
+        """Instructions start to end - 1 of the trace as columns.
+
+        Rows are the instructions yielded by instructions(start, end). Columns
+        are views of the trace, without copy, so that a trace held in memory
+        cannot be extended while tables of it are alive. Register files are
+        read from the history of the trace.
+
+        This requires numpy, which is only imported on the first call.
+
+        """
+        import numpy as np
+
+        count: int = max(len(self) - 1, 0)
+        stop: int = count if end is None else min(count, end)
+        start = min(start, stop)
+
+        def column(name: str, offset: int = 0) -> "np.ndarray":
+            values = np.frombuffer(self.columns[name], dtype=ENTRY_COLUMNS[name])
+            return values[start + offset : stop + offset]
+
+        return TraceTable(
+            pc=column("pc"),
+            next_pc=column("pc", 1),
+            word=column("word"),
+            cflow=column("cflow"),
+            rd=column("rd"),
+            rs1=column("rs1"),
+            rs2=column("rs2"),
+            text=column("text"),
+            entry=np.arange(start, stop, dtype=np.uint64),
+            texts=self.texts,
+            history=self.history,
+        )
+
+    def write(self, path: str, key: Key) -> None:
+        """Atomically write the cache file at path, with its history checkpoints"""
+
+        name, typecode = CHECKPOINT_COLUMN
+        columns: Dict[str, Sequence[int]] = {
+            **self.columns,
+            name: self.history().checkpoints,
+        }
+        types: Dict[str, str] = {**ENTRY_COLUMNS, **GPR_COLUMNS, name: typecode}
+
+        layout: Dict[str, Tuple[str, int, int]] = {}
+        offset: int = 0
+        for name, column in columns.items():
+            typecode = types[name]
+            layout[name] = (typecode, offset, len(column))
+            offset = _align(offset + len(column) * array.array(typecode).itemsize)
+
+        header: bytes = json.dumps(
+            {
+                "key": key,
+                "texts": self.texts,
+                "columns": layout,
+            }
+        ).encode()
+
+        tmp: str = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            start: int = f.tell()
+            for name, (typecode, offset, _) in layout.items():
+                f.write(b"\0" * (start + offset - f.tell()))
+                f.write(array.array(typecode, columns[name]).tobytes())
+
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, key: Key) -> Optional["TraceCache"]:
+        """Map the cache file at path if it exists and matches key"""
+
+        try:
+            with open(path, "rb") as f:
+                mm: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if mm[: len(MAGIC)] != MAGIC:
+            _logger.warning(f"Ignoring trace cache {path}: not a trace cache")
+            return None
+
+        (size,) = struct.unpack_from("<Q", mm, len(MAGIC))
+        header_start: int = len(MAGIC) + 8
+        try:
+            header = json.loads(mm[header_start : header_start + size])
+        except ValueError:
+            _logger.warning(f"Ignoring trace cache {path}: corrupted header")
+            return None
+
+        if header["key"] != key:
+            version = header["key"].get("version")
+            if version != key["version"]:
+                _logger.info(
+                    f"Rebuilding trace cache {path}: version {version}, "
+                    f"expected {key['version']}"
+                )
+            else:
+                _logger.info(f"Rebuilding trace cache {path}: the log has changed")
+            return None
+
+        start: int = _align(header_start + size)
+        view: memoryview = memoryview(mm)
+        columns: Dict[str, Sequence[int]] = {}
+        for name, (typecode, offset, count) in header["columns"].items():
+            nbytes: int = count * array.array(typecode).itemsize
+            columns[name] = view[start + offset : start + offset + nbytes].cast(
+                typecode
+            )
+
+        return cls(columns, header["texts"])
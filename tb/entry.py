@@ -1,7 +1,7 @@
-from typing import Dict
+from typing import Dict, List
 
 import pytest
-from runner import run_tests
+from runner import get_parameter_sets, is_runtime, run_multi_tests, run_tests
 
 """Main entry point of the testbench.
 
@@ -13,9 +13,17 @@ For each IP, a set of parameters can be defined.
 """
 
 
-@pytest.mark.parametrize("JopThreshold", [100, 120])
-@pytest.mark.parametrize("StepUpValue", [10, 20])
-@pytest.mark.parametrize("StepDownValue", [1, 4])
+# Values of the parameters of jop_alarm swept by the tests
+JOP_ALARM_PARAMETERS: Dict[str, List[int]] = {
+    "JopThreshold": [100, 120],
+    "StepUpValue": [10, 20],
+    "StepDownValue": [1, 4],
+}
+
+
+@pytest.mark.parametrize("JopThreshold", JOP_ALARM_PARAMETERS["JopThreshold"])
+@pytest.mark.parametrize("StepUpValue", JOP_ALARM_PARAMETERS["StepUpValue"])
+@pytest.mark.parametrize("StepDownValue", JOP_ALARM_PARAMETERS["StepDownValue"])
 def test_jop_alarm_ip(JopThreshold, StepUpValue, StepDownValue):
     """jop_alarm IP entry point"""
 
@@ -25,4 +33,22 @@ def test_jop_alarm_ip(JopThreshold, StepUpValue, StepDownValue):
         "StepDownValue": StepDownValue,
     }
 
-    run_tests("jop_alarm", parameters, "jop_alarm/hw/", sim="verilator")
+    # All the parameter sets share one build if the parameters are set at runtime
+    run_tests(
+        "jop_alarm",
+        parameters,
+        "jop_alarm/hw/",
+        sim="verilator",
+        runtime=list(parameters) if is_runtime() else None,
+    )
+
+
+def test_jop_alarm_ip_multi():
+    """jop_alarm IP entry point, with every set of parameters in one simulation"""
+
+    run_multi_tests(
+        "jop_alarm",
+        get_parameter_sets(JOP_ALARM_PARAMETERS),
+        "jop_alarm/hw/",
+        sim="verilator",
+    )
@@ -0,0 +1,114 @@
+"""Reference models of the IPs, evaluated on whole traces.
+
+The models compute from the stimulus of a trace when an IP raises an
+exception, for many parameter sets at once, so that a parameter sweep only
+needs HDL simulations to cross-check a few of its points.
+
+This requires numpy, which is only imported by the functions that need it.
+"""
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Width of the counter of jop_alarm
+JOP_COUNTER_MAX: int = (1 << 32) - 1
+
+# Number of instructions evaluated at once
+CHUNK_SIZE: int = 1 << 20
+
+
+@lru_cache(maxsize=None)
+def jop_alarm_defaults() -> Dict[str, int]:
+    """Default parameters of jop_alarm, read from its HDL sources"""
+    from runner import get_parameters, get_sources, tests_dir
+
+    rtl_dir: str = os.path.abspath(
+        os.path.join(tests_dir, "..", "ips", "jop_alarm/hw/")
+    )
+    sources: List[str] = get_sources("jop_alarm", rtl_dir)
+    return {
+        name: int(default) for _, name, default in get_parameters("jop_alarm", sources)
+    }
+
+
+def jop_alarm_first_alarms(
+    is_ind_jump: "np.ndarray", parameters: List[Dict[str, int]]
+) -> List[Optional[int]]:
+    """Index of the first instruction raising alarm_o, for each parameter set.
+
+    is_ind_jump is the mask of the indirect jumps of the instructions driven
+    on jop_alarm, one per clock cycle, e.g. TraceTable.is_indirect_jump. The
+    counter is increased by StepUpValue on indirect jumps and decreased by
+    StepDownValue otherwise, saturating at zero, and the alarm is raised once
+    it exceeds JopThreshold. None means that the alarm is never raised.
+
+    The counter after n instructions is the prefix sum of its steps minus
+    the lowest prefix sum before it, which is computed with numpy for whole
+    chunks of the trace. The counter cannot saturate at its maximum before
+    raising the alarm, unless the threshold is this maximum.
+
+    """
+    import numpy as np
+
+    sets: List[Dict[str, int]] = [{**jop_alarm_defaults(), **p} for p in parameters]
+    counters: List[int] = [0] * len(sets)
+    alarms: List[Optional[int]] = [
+        None if p["JopThreshold"] >= JOP_COUNTER_MAX else -1 for p in sets
+    ]
+
+    for start in range(0, len(is_ind_jump), CHUNK_SIZE):
+        if all(alarm != -1 for alarm in alarms):
+            break
+
+        jumps: "np.ndarray" = np.cumsum(
+            is_ind_jump[start : start + CHUNK_SIZE], dtype=np.int64
+        )
+        cycles: "np.ndarray" = np.arange(1, len(jumps) + 1, dtype=np.int64)
+
+        for i, p in enumerate(sets):
+            if alarms[i] != -1:
+                continue
+
+            up: int = p["StepUpValue"]
+            down: int = p["StepDownValue"]
+            steps: "np.ndarray" = (up + down) * jumps - down * cycles
+            counter: "np.ndarray" = steps - np.minimum(
+                np.minimum.accumulate(steps), -counters[i]
+            )
+
+            above: "np.ndarray" = np.flatnonzero(counter > p["JopThreshold"])
+            if len(above):
+                alarms[i] = start + int(above[0])
+            else:
+                counters[i] = int(counter[-1])
+
+    return [None if alarm == -1 else alarm for alarm in alarms]
+
+
+def jop_alarm_first_alarm(
+    is_ind_jump: "np.ndarray", parameters: Dict[str, int]
+) -> Optional[int]:
+    """Index of the first instruction raising alarm_o, cycle by cycle.
+
+    Straightforward model of the counter of jop_alarm, including its
+    saturation, to cross-check jop_alarm_first_alarms.
+
+    """
+
+    p: Dict[str, int] = {**jop_alarm_defaults(), **parameters}
+    counter: int = 0
+
+    for i, jump in enumerate(is_ind_jump.tolist()):
+        if jump:
+            counter = min(counter + p["StepUpValue"], JOP_COUNTER_MAX)
+        else:
+            counter = max(counter - p["StepDownValue"], 0)
+
+        if counter > p["JopThreshold"]:
+            return i
+
+    return None
@@ -0,0 +1,174 @@
+"""Static pre-decode of application binaries.
+
+The code of an application is known before it runs on Spike: it is decoded
+once from the executable sections of its ELF, or from its objdump output, into
+a table indexed by pc. Decoding a trace entry is then a lookup in this table,
+checked against the binary word logged by Spike. Code that does not match the
+image, e.g. self-modifying code, is decoded from the log.
+"""
+
+import logging
+import os
+import re
+import struct
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+from riscv_disassembler import disassemble, dsm
+
+_logger: logging.Logger = logging.getLogger("aspycot.image")
+
+ELF_MAGIC: bytes = b"\x7fELF"
+
+# Section type and flag of the sections holding code
+SHT_PROGBITS: int = 1
+SHF_EXECINSTR: int = 0x4
+
+# Instruction lines of objdump -d output, e.g. "80000000:	4081    li	ra,0"
+OBJDUMP_RE = re.compile(r"^\s*([0-9a-f]+):\s+([0-9a-f]{4}|[0-9a-f]{8})\s")
+
+
+def is_predecode() -> bool:
+    """Whether trace entries are decoded from the static image of the binary"""
+    return os.getenv("ASPYCOT_PREDECODE", "1") != "0"
+
+
+def get_elf_path(path: str) -> Optional[str]:
+    """Path of the binary of an application from the one of its Spike log"""
+    head, sep, _ = path.rpartition(".riscv")
+    return head + sep if sep else None
+
+
+def read_elf_code(path: str) -> Iterator[Tuple[int, bytes]]:
+    """Address and content of the executable sections of an ELF file"""
+
+    with open(path, "rb") as f:
+        elf: bytes = f.read()
+
+    if elf[:4] != ELF_MAGIC:
+        raise ValueError(f"{path} is not an ELF file")
+
+    is_64: bool = elf[4] == 2
+    endian: str = "<" if elf[5] == 1 else ">"
+
+    if is_64:
+        shoff, shentsize, shnum = (
+            struct.unpack_from(f"{endian}Q", elf, 0x28)[0],
+            *struct.unpack_from(f"{endian}HH", elf, 0x3A),
+        )
+        section: str = f"{endian}IIQQQQ"
+    else:
+        shoff, shentsize, shnum = (
+            struct.unpack_from(f"{endian}I", elf, 0x20)[0],
+            *struct.unpack_from(f"{endian}HH", elf, 0x2E),
+        )
+        section = f"{endian}IIIIII"
+
+    for i in range(shnum):
+        _, sh_type, sh_flags, sh_addr, sh_offset, sh_size = struct.unpack_from(
+            section, elf, shoff + i * shentsize
+        )
+        if sh_type == SHT_PROGBITS and sh_flags & SHF_EXECINSTR:
+            yield sh_addr, elf[sh_offset : sh_offset + sh_size]
+
+
+def read_elf_words(path: str) -> Dict[int, int]:
+    """Instruction words of the executable sections of an ELF file, by pc.
+
+    Sections are swept linearly, the length of each instruction being given by
+    its two lowest bits. Data in the middle of code may misalign the sweep,
+    which the check against the Spike log catches.
+
+    """
+
+    words: Dict[int, int] = {}
+
+    for addr, code in read_elf_code(path):
+        offset: int = 0
+        while offset + 2 <= len(code):
+            (half,) = struct.unpack_from("<H", code, offset)
+            if half & 0x3 != 0x3:
+                words[addr + offset] = half
+                offset += 2
+            elif offset + 4 <= len(code):
+                (words[addr + offset],) = struct.unpack_from("<I", code, offset)
+                offset += 4
+            else:
+                break
+
+    return words
+
+
+def read_objdump_words(path: str) -> Dict[int, int]:
+    """Instruction words of objdump -d output, by pc"""
+
+    words: Dict[int, int] = {}
+
+    with open(path, "r") as f:
+        for line in f:
+            match = OBJDUMP_RE.match(line)
+            if match:
+                words[int(match.group(1), 16)] = int(match.group(2), 16)
+
+    return words
+
+
+class ProgramImage:
+    """Decoded instructions of an application, indexed by pc"""
+
+    def __init__(self, words: Dict[int, int]) -> None:
+        self.decoded: Dict[int, Tuple[int, dsm]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+        for pc, word in words.items():
+            disassembled: Optional[dsm] = disassemble(word, pc)
+            if disassembled is not None:
+                self.decoded[pc] = (word, disassembled)
+
+    def __len__(self) -> int:
+        return len(self.decoded)
+
+    def get(self, pc: int, word: int) -> Optional[dsm]:
+        """Decoded instruction at pc if the image holds word there"""
+
+        entry: Optional[Tuple[int, dsm]] = self.decoded.get(pc)
+        if entry is not None and entry[0] == word:
+            self.hits += 1
+            return entry[1]
+
+        if entry is not None:
+            _logger.debug(f"{word:#x} at {pc:#x} differs from the image {entry[0]:#x}")
+
+        self.misses += 1
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_image(path: str) -> Optional[ProgramImage]:
+    """Pre-decode the binary of an application from its ELF or log path.
+
+    The ELF file is read if it exists, else its .dump next to it. Returns None
+    when neither can be read.
+
+    """
+
+    elf: Optional[str] = get_elf_path(path)
+    if elf is None:
+        return None
+
+    dump: str = f"{elf}.dump"
+
+    try:
+        if os.path.isfile(elf):
+            image: ProgramImage = ProgramImage(read_elf_words(elf))
+        elif os.path.isfile(dump):
+            image = ProgramImage(read_objdump_words(dump))
+        else:
+            return None
+    except (OSError, ValueError, struct.error) as e:
+        _logger.warning(f"Unable to pre-decode {elf}: {e}")
+        return None
+
+    _logger.info(f"Pre-decoded {len(image)} instructions : {elf}")
+    return image
@@ -0,0 +1,137 @@
+"""Sparse index of Spike logs for random access.
+
+The index is written next to the Spike log it was built from and maps some
+instruction numbers to their byte offset in the log and to the register file
+holding the commits of all the instructions before them. Reading a window of
+the trace then starts from the closest index point instead of the beginning of
+the log.
+"""
+
+import bisect
+import json
+import logging
+import os
+from contextlib import nullcontext
+from typing import ContextManager, List, NamedTuple, Optional
+
+from arch import RegisterFile, write_rf
+from cache import Key, fingerprint
+from runner import locked
+from vendor.spike_log_to_trace_csv import read_spike_trace_mmap, split_spike_log
+
+_logger: logging.Logger = logging.getLogger("aspycot.index")
+
+# Approximate number of log bytes between two index points
+INDEX_CHUNK_SIZE: int = 4 << 20
+
+
+class IndexPoint(NamedTuple):
+    entry: int
+    offset: int
+    rf: List[int]
+
+
+def get_index_path(log: str) -> str:
+    """Path of the index associated to a Spike log"""
+    return f"{log}.index"
+
+
+def sidecar_lock(path: str) -> ContextManager[bool]:
+    """Lock building the sidecar file path of a log, see runner.locked.
+
+    Concurrent tests reading the same log wait for the one building its
+    sidecar, then load it. Sidecars that cannot be written are not locked.
+
+    """
+
+    if not os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+        return nullcontext(False)
+    return locked(f"{path}.lock")
+
+
+def build_index(log: str) -> List[IndexPoint]:
+    """Index a Spike log every INDEX_CHUNK_SIZE bytes.
+
+    Compressed logs cannot be read from an offset and only get the index point
+    of their first instruction.
+
+    """
+
+    count: int = max(1, os.path.getsize(log) // INDEX_CHUNK_SIZE)
+    points: List[IndexPoint] = []
+    rf: RegisterFile = RegisterFile()
+    entries: int = 0
+
+    for start, end in split_spike_log(log, count):
+        points.append(IndexPoint(entries, start, list(rf)))
+
+        for entry, _ in read_spike_trace_mmap(log, 0, lean=True, start=start, end=end):
+            entries += 1
+            for g in entry.gpr:
+                reg, val = g.split(":")
+                write_rf(rf, reg, int(val, 16))
+
+            if entry.instr_str == "ecall":
+                return points
+
+    return points
+
+
+class TraceIndex:
+    """Index points of a Spike log, sorted by instruction number"""
+
+    def __init__(self, points: List[IndexPoint]) -> None:
+        self.points: List[IndexPoint] = points
+        self._entries: List[int] = [p.entry for p in points]
+
+    def seek(self, entry: int) -> IndexPoint:
+        """Closest index point at or before an instruction number"""
+        return self.points[max(0, bisect.bisect_right(self._entries, entry) - 1)]
+
+    def write(self, path: str, key: Key) -> None:
+        """Atomically write the index file at path"""
+
+        tmp: str = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "points": self.points}, f)
+
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, key: Key) -> Optional["TraceIndex"]:
+        """Read the index file at path if it exists and matches key"""
+
+        try:
+            with open(path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if index["key"] != key:
+            return None
+
+        return cls([IndexPoint(*p) for p in index["points"]])
+
+
+def load_index(log: str) -> TraceIndex:
+    """Load the index of a Spike log, building it on a miss."""
+
+    index_path: str = get_index_path(log)
+    key: Key = fingerprint(log)
+
+    # Built once by the first of the tests reading the same log
+    with sidecar_lock(index_path):
+        index: Optional[TraceIndex] = TraceIndex.load(index_path, key)
+        if index is not None:
+            return index
+
+        _logger.info(f"Building trace index : {index_path}")
+
+        index = TraceIndex(build_index(log))
+
+        try:
+            index.write(index_path, key)
+        except OSError as e:
+            _logger.warning(f"Unable to write trace index {index_path}: {e}")
+
+    return index
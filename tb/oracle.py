@@ -1,10 +1,12 @@
 import json
 import os
 from abc import ABC, abstractmethod
-from typing import Dict, List, Type
+from typing import Any, Dict, List, Optional, Type
 
+from cocotb.triggers import First, RisingEdge
+from cocotb.utils import get_sim_time
 from models import ThreatModel, get_model
-from runner import sw_dir
+from runner import get_ip, sw_dir
 from wrappers import Wrapper
 
 
@@ -18,13 +20,24 @@ def read_json() -> Dict[str, List[str]]:
 class Oracle(ABC):
     classification: Dict[str, str] = read_json()
 
-    def __init__(self, app: str) -> None:
+    def __init__(self, app: str, instances: int = 1) -> None:
         self.app: str = app
         self.model: ThreatModel = get_model(Oracle.classification[app])
         self.early_exit: bool = False
 
+        # Index of the instruction raising an exception, for each instance
+        self.exit_indexes: List[Optional[int]] = [None] * instances
+
     @abstractmethod
-    async def check_exit_condition(self, wrapper: Wrapper) -> bool:
+    async def monitor(self, wrapper: Wrapper, period: float, first: int) -> None:
+        """Watch the IP while the trace runs, setting early_exit on exit.
+
+        Started concurrently with the driver, when instruction first of the
+        trace is driven. Instructions last one clock period of period ns.
+        With several instances of the IP, the trace runs until all of them
+        exit.
+
+        """
         pass
 
     @abstractmethod
@@ -33,42 +46,66 @@ class Oracle(ABC):
 
 
 class CFI(Oracle):
-    def __init__(self, app) -> None:
-        super().__init__(app)
+    def __init__(self, app, instances: int = 1) -> None:
+        super().__init__(app, instances)
+
+    async def monitor(self, wrapper: Wrapper, period: float, first: int) -> None:
+        start: float = get_sim_time(units="ns")
+
+        pending: Dict[int, List[Any]] = {
+            i: wrapper.exceptions(i) for i in range(len(self.exit_indexes))
+        }
 
-    async def check_exit_condition(self, wrapper: Wrapper) -> bool:
-        if await wrapper.raised_exception():
-            self.early_exit = True
-            return True
+        while pending:
+            await First(
+                *(RisingEdge(s) for signals in pending.values() for s in signals)
+            )
 
-        return False
+            # The exception rises on the clock edge ending the instruction
+            # raising it, whatever coroutine the simulator resumes first
+            cycles: int = round((get_sim_time(units="ns") - start) / period)
+
+            # Several instances may raise an exception on the same edge
+            for i, signals in list(pending.items()):
+                if any(s.value == 1 for s in signals):
+                    self.exit_indexes[i] = first + cycles - 1
+                    del pending[i]
+
+        self.early_exit = True
 
     def decision(self, wrapper: Wrapper):
-        # Depending on the type of applications, execeptions can be expected or not
-        if self.early_exit and self.model == ThreatModel.LEGIT:
-            assert (
-                False
-            ), f"False positive: execution of {self.app} led to an exception."
+        errors: List[str] = []
+
+        for i, exit_index in enumerate(self.exit_indexes):
+            prefix: str = wrapper.label(i)
+
+            # Depending on the type of applications, execeptions can be expected or not
+            if exit_index is not None and self.model == ThreatModel.LEGIT:
+                errors.append(
+                    f"{prefix}False positive: execution of {self.app} led to an exception."
+                )
+
+            if (
+                self.model != ThreatModel.LEGIT
+                and exit_index is None
+                and wrapper.can_detect(self.model)
+            ):
+                errors.append(
+                    f"{prefix}False negative: execution of {self.app} raised no exception."
+                )
 
-        if (
-            self.model != ThreatModel.LEGIT
-            and not self.early_exit
-            and wrapper.can_detect(self.model)
-        ):
-            assert (
-                False
-            ), f"False negative: execution of {self.app} raised no exception."
+        assert not errors, "\n".join(errors)
 
 
-def get_oracle(dut, app: str) -> Oracle:
-    """Build oracle depending on the IP"""
+def get_oracle(dut, app: str, instances: int = 1) -> Oracle:
+    """Build oracle depending on the IP, watching instances of it"""
 
     supported_ips: Dict[str, Type[Oracle]] = {
         "jop_alarm": CFI,
     }
-    ip: str = dut._name
+    ip: str = get_ip(dut._name)
     try:
-        return supported_ips[ip](app)
+        return supported_ips[ip](app, instances)
     except KeyError:
         raise ValueError(
             f"IP {ip!r} is not in supported IPs: {', '.join(supported_ips.keys())}"
@@ -1,38 +1,263 @@
 import logging
 import os
 import sys
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from arch import Instruction, write_rf
-from riscv_disassembler import disassemble, dsm
+from arch import GPR_COUNT, Instruction, RegisterFile, TraceTable, write_rf
+from cache import TraceCache, fingerprint, get_cache_path
+from image import ProgramImage, is_predecode, load_image
+from index import IndexPoint, load_index, sidecar_lock
+from riscv_disassembler import decode_cache_info, disassemble, dsm
 from runner import sw_dir
-from vendor.spike_log_to_trace_csv import read_spike_trace
+from spike import is_live, spike_log_stream
+from vendor.spike_log_to_trace_csv import (
+    read_spike_stream,
+    read_spike_trace_mmap,
+    split_spike_log,
+)
 
 _logger: logging.Logger = logging.getLogger("aspycot.parser")
 _logger.setLevel(4)
 
+# Suffixes of the Spike logs of an application
+LOG_SUFFIXES: List[str] = [
+    ".riscv.log",
+    ".riscv.log.gz",
+    ".riscv.log.xz",
+    ".riscv.log.bz2",
+]
+
+# Minimum size of the chunks of a log decoded in parallel
+CHUNK_SIZE: int = 32 << 20
+
 
 def get_apps_path() -> Dict[str, str]:
-    """Based on environment variables, retrieve paths of the apps to parse."""
+    """Based on environment variables, retrieve paths of the apps to parse.
+
+    Logs can be compressed with gzip, xz or bzip2, the most recent one being
+    used if several exist. In live mode (ASPYCOT_LIVE=1), the paths are the
+    ones of the application binaries, which are run on Spike by get_app_instr.
+
+    """
 
     bmarks: str = os.getenv("ASPYCOT_BMARKS", "hello_world")
+    suffixes: List[str] = [".riscv"] if is_live() else LOG_SUFFIXES
 
     apps: List[str] = bmarks.split(",")
     traces: Dict[str, str] = {}
 
     for app in apps:
-        trace: str = os.path.join(sw_dir, f"build/{app}/{app}.riscv.log")
+        candidates: List[str] = [
+            os.path.join(sw_dir, f"build/{app}/{app}{suffix}") for suffix in suffixes
+        ]
+        found: List[str] = [c for c in candidates if os.path.isfile(c)]
 
-        if not os.path.isfile(trace):
-            _logger.info(f"Trace file for {app} does not exist: {trace}.")
+        if not found:
+            _logger.info(f"Trace file for {app} does not exist: {candidates[0]}.")
             sys.exit(1)
 
-        traces[app] = trace
+        # Logs may be left over from a run with another compression
+        traces[app] = max(found, key=os.path.getmtime)
 
     return traces
 
 
-def get_app_instr(path: str):
+def _decode_entries(
+    entries, image: Optional[ProgramImage] = None
+) -> Iterator[Tuple[int, int, dsm, List[str]]]:
+    """Decode the entries of a Spike log.
+
+    Yields tuples (pc, binary, disassembled, gpr) where gpr is the list of GPR
+    commits of the entry. Entries are looked up in the pre-decoded image of
+    the application if any, and only disassembled if it holds another word.
+
+    """
+
+    for entry, _ in entries:
+        pc: int = int(entry.pc, 16)
+        binary: int = int(entry.binary, 16)
+
+        disassembled: Optional[dsm] = image.get(pc, binary) if image else None
+        if disassembled is None:
+            disassembled = disassemble(binary, pc)
+
+        if not disassembled:
+            _logger.error(f"Unsupported instruction: {entry.instr_str}")
+            sys.exit(1)
+
+        yield pc, binary, disassembled, entry.gpr
+
+
+def _read_app_log(
+    path: str, start: int = 0, end: Optional[int] = None
+) -> Iterator[Tuple[int, int, dsm, List[str]]]:
+    """Decode every entry of a Spike log, see _decode_entries."""
+
+    yield from _decode_entries(
+        read_spike_trace_mmap(path, 0, lean=True, start=start, end=end),
+        load_image(path) if is_predecode() else None,
+    )
+
+
+def _run_app(elf: str) -> Iterator[Tuple[int, int, dsm, List[str]]]:
+    """Run an application on Spike and decode its log, see _decode_entries."""
+
+    with spike_log_stream(elf) as log:
+        yield from _decode_entries(
+            read_spike_stream(log, 0, lean=True),
+            load_image(elf) if is_predecode() else None,
+        )
+
+
+def _decode_chunk(path: str, start: int, end: Optional[int]) -> Tuple[TraceCache, bool]:
+    """Decode a byte range of a Spike log.
+
+    Returns the decoded trace and whether the range ended on the ecall that
+    terminates the log.
+
+    """
+
+    trace: TraceCache = TraceCache()
+    stopped: bool = False
+
+    for pc, binary, disassembled, gpr in _read_app_log(path, start, end):
+        trace.append(pc, binary, disassembled, gpr)
+        stopped = disassembled.text == "ecall"
+
+    return trace, stopped
+
+
+def decode_trace(path: str, jobs: int = 1) -> TraceCache:
+    """Decode a Spike log into a trace.
+
+    Logs larger than CHUNK_SIZE are split at instruction boundaries and the
+    chunks are decoded by up to jobs processes, then merged in order.
+
+    """
+
+    # Loaded before forking, so that workers share the pre-decoded image
+    if is_predecode():
+        load_image(path)
+
+    # Forking a multi-threaded process may deadlock, see prepare_app
+    if threading.active_count() > 1:
+        jobs = 1
+
+    count: int = min(jobs, os.path.getsize(path) // CHUNK_SIZE)
+    chunks: List[Tuple[int, Optional[int]]] = (
+        split_spike_log(path, count) if count > 1 else []
+    )
+
+    if len(chunks) <= 1:
+        return _decode_chunk(path, 0, None)[0]
+
+    trace: TraceCache = TraceCache()
+
+    # Fork rather than spawn: the testbench runs in the simulator process,
+    # which cannot be started again as a Python interpreter.
+    with ProcessPoolExecutor(len(chunks), mp_context=get_context("fork")) as pool:
+        for chunk, stopped in pool.map(_decode_chunk, repeat(path), *zip(*chunks)):
+            trace.extend(chunk)
+            if stopped:
+                break
+
+    return trace
+
+
+def get_jobs() -> int:
+    """Number of processes decoding a log, from ASPYCOT_JOBS.
+
+    Defaults to the number of CPUs, shared among the pytest-xdist workers.
+
+    """
+
+    cpus: int = os.cpu_count() or 1
+    workers: int = int(os.getenv("PYTEST_XDIST_WORKER_COUNT", 1))
+    return int(os.getenv("ASPYCOT_JOBS", max(1, cpus // workers)))
+
+
+def is_trace_cache() -> bool:
+    """Whether decoded traces are cached next to their log"""
+    return os.getenv("ASPYCOT_TRACE_CACHE", "1") != "0"
+
+
+def load_trace_cache(path: str) -> TraceCache:
+    """Load the trace cache of a Spike log, building it on a miss."""
+
+    cache_path: str = get_cache_path(path)
+    key = fingerprint(path)
+
+    # Built once by the first of the tests decoding the same log
+    with sidecar_lock(cache_path):
+        trace: Optional[TraceCache] = TraceCache.load(cache_path, key)
+        if trace is not None:
+            _logger.info(f"Using trace cache : {cache_path}")
+            return trace
+
+        _logger.info(f"Building trace cache : {cache_path}")
+
+        trace = decode_trace(path, get_jobs())
+
+        _logger.info(f"Decode cache : {decode_cache_info()}")
+
+        try:
+            trace.write(cache_path, key)
+        except OSError as e:
+            _logger.warning(f"Unable to write trace cache {cache_path}: {e}")
+
+    return trace
+
+
+def get_app_range() -> Tuple[int, Optional[int]]:
+    """Based on environment variables, retrieve the range of instructions to run.
+
+    ASPYCOT_RANGE=start:end selects instructions start to end - 1 of the
+    trace, either bound being optional.
+
+    """
+
+    window: str = os.getenv("ASPYCOT_RANGE", ":")
+
+    try:
+        first, last = window.split(":")
+        start, end = int(first or 0), int(last) if last else None
+    except ValueError:
+        _logger.error(f"Invalid instruction range: {window}, expected start:end")
+        sys.exit(1)
+
+    if start < 0 or (end is not None and start >= end):
+        _logger.error(f"Empty instruction range: {window}, expected 0 <= start < end")
+        sys.exit(1)
+
+    return start, end
+
+
+def prepare_app(path: str, start: int = 0) -> None:
+    """Build the files next to the log of an application read by get_app_instr.
+
+    Building the trace cache forks decoding processes, see decode_trace,
+    which must be done before the stimulus is built by a thread: forking a
+    multi-threaded process can deadlock on the locks held by the other
+    threads.
+
+    """
+
+    if is_live():
+        return
+
+    if is_trace_cache():
+        load_trace_cache(path)
+    elif start:
+        load_index(path)
+
+
+def get_app_instr(
+    path: str, start: int = 0, end: Optional[int] = None
+) -> Iterator[Tuple[Instruction, int]]:
     """Process SPIKE simulation log.
 
     Extract instruction and affected register information from spike simulation
@@ -41,45 +266,108 @@ def get_app_instr(path: str):
 
     This function is an adaptation of Google script to parse Spike logs to CSV.
 
+    Unless ASPYCOT_TRACE_CACHE is set to 0, the decoded trace is read from a
+    cache stored next to the log, which is built on the first call using up
+    to ASPYCOT_JOBS processes.
+
+    Only instructions start to end - 1 are yielded. Reading starts from the
+    closest point of the log index, see index.load_index, or from the
+    register file history of the cached trace, so that the cost of a window
+    does not depend on its position in the trace.
+
+    The register file of each instruction is a snapshot of the GPRs once it
+    has executed, see arch.RegisterFile.
+
+    In live mode, path is the application binary, which is run on Spike while
+    its log is consumed.
+
     """
 
-    _logger.info("Processing spike log : {}".format(path))
+    point: IndexPoint = IndexPoint(0, 0, [0] * GPR_COUNT)
+
+    if is_live():
+        _logger.info("Running on spike : {}".format(path))
+        decoded = _run_app(path)
+    else:
+        _logger.info("Processing spike log : {}".format(path))
+
+        if is_trace_cache():
+            trace: TraceCache = load_trace_cache(path)
+            first: int = min(start, len(trace))
+            # The history checkpoints are stored in the cache, see TraceCache.write
+            rf: RegisterFile = (
+                trace.history().before(first) if first else RegisterFile()
+            )
+            yield from trace.instructions(start, end, rf, first)
+            return
+
+        if start:
+            point = load_index(path).seek(start)
+
+        decoded = _read_app_log(path, point.offset)
 
     instruction: Optional[Instruction] = None
-    rf: Dict[str, int] = {}
+    rf: RegisterFile = RegisterFile(point.rf)
 
-    total_insns: int = 0
+    total_insns: int = point.entry
 
-    for entry, _ in read_spike_trace(path, 1):
+    for pc, binary, disassembled, gpr in decoded:
         total_insns += 1
 
-        if total_insns != 1:
+        if total_insns != point.entry + 1:
             instruction = Instruction(
-                pc=int(pc, 16),
-                next_pc=int(entry.pc, 16),
-                instr=disassembled.instr,
-                rd=disassembled.rd,
-                rs1=disassembled.rs1,
-                rs2=disassembled.rs2,
-                rf=rf,
+                pc=prev.pc,
+                next_pc=pc,
+                text=prev.text,
+                rd=prev.rd,
+                rs1=prev.rs1,
+                rs2=prev.rs2,
+                rf=rf.snapshot(),
+                cflow=prev.cflow,
+                target=prev.target,
             )
 
-        pc = entry.pc
-        instr = entry.instr
-        gpr = entry.gpr
-        binary = entry.binary
-
-        disassembled: Optional[dsm] = disassemble(int(binary, 16), int(pc, 16))
-
-        if not disassembled:
-            _logger.error(f"Unsupported instruction: {instr}")
-            sys.exit(1)
+        prev: dsm = disassembled
 
         # If there is a GPR update, process it
         if gpr:
             for g in gpr:
                 reg, val = g.split(":")
-                write_rf(rf, reg, val)
+                write_rf(rf, reg, int(val, 16))
 
         if instruction is not None:
-            yield instruction, total_insns
+            if end is not None and total_insns - 2 >= end:
+                break
+            if total_insns - 2 >= start:
+                yield instruction, total_insns
+
+
+def get_app_trace(path: str) -> TraceCache:
+    """Decoded trace of an application, e.g. for its register file history.
+
+    The trace is read from its cache unless ASPYCOT_TRACE_CACHE is set to 0.
+    In live mode, path is the application binary, which is run on Spike.
+
+    """
+
+    if is_live():
+        trace: TraceCache = TraceCache()
+        for pc, binary, disassembled, gpr in _run_app(path):
+            trace.append(pc, binary, disassembled, gpr)
+        return trace
+
+    if is_trace_cache():
+        return load_trace_cache(path)
+
+    return decode_trace(path, get_jobs())
+
+
+def get_app_table(path: str, start: int = 0, end: Optional[int] = None) -> TraceTable:
+    """Instructions start to end - 1 of an application as columns.
+
+    The rows are the instructions yielded by get_app_instr, read from the
+    decoded trace of get_app_trace.
+
+    """
+
+    return get_app_trace(path).table(start, end)
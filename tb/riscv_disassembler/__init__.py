@@ -1,3 +1,21 @@
-from .riscv_disassembler import disassemble, dsm
+from .riscv_disassembler import (
+    ControlFlow,
+    decode_cache_clear,
+    decode_cache_info,
+    disassemble,
+    disassemble_batch,
+    dsm,
+    dsm_batch,
+    get_control_flow,
+)
 
-__all__ = ["disassemble", "dsm"]
+__all__ = [
+    "ControlFlow",
+    "decode_cache_clear",
+    "decode_cache_info",
+    "disassemble",
+    "disassemble_batch",
+    "dsm",
+    "dsm_batch",
+    "get_control_flow",
+]
@@ -2,14 +2,17 @@
 Module containing a function for disassembling RISC-V instructions
 and functions for each instruction's format.
 """
+
 from dataclasses import dataclass
-from typing import Optional
+from enum import IntEnum
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, NamedTuple, Optional, Tuple
 
 from .riscv_instructions_parser import (
+    Decoded,
     get_addi4spn_imm,
     get_addi16sp_imm,
     get_b_type_imm,
-    get_c_instruction,
     get_cb_offset,
     get_ci_cr_dest_reg,
     get_ci_nzuimm,
@@ -21,13 +24,11 @@ from .riscv_instructions_parser import (
     get_compressed_rs2_rd,
     get_cr_source_reg,
     get_css_offset,
-    get_fdq_instruction,
     get_fence_ps,
     get_funct3,
     get_funct5,
     get_i_type_imm,
     get_i_type_shamt,
-    get_instruction,
     get_j_type_imm,
     get_jump_target,
     get_opcode,
@@ -38,27 +39,74 @@ from .riscv_instructions_parser import (
     get_s_type_imm,
     get_suffix_aqrl,
     get_u_type_imm,
+    lookup_instruction,
 )
-from .riscv_instructions_table import (
-    C_OPCODES,
-    CSR_ADDR,
-    FDQ_OPCODES,
-    INSTR_FORMAT_BY_OPC,
-)
+from .riscv_instructions_table import CSR_ADDR
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class ControlFlow(IntEnum):
+    """Control-flow class of an instruction"""
+
+    NONE = 0
+    BRANCH = 1
+    JUMP = 2
+    CALL = 3
+    INDIRECT_JUMP = 4
+    INDIRECT_CALL = 5
+    RETURN = 6
+    TRAP = 7
 
 
 @dataclass
 class dsm:
+    """Disassembled instruction.
+
+    For pc-relative branches and jumps, text is the disassembly up to the
+    target and target the offset of the target from pc, so that instr is only
+    rendered when read.
+
+    """
+
     pc: int
-    instr: str
+    text: str
+    rd: int
+    rs1: int
+    rs2: int
+    cflow: ControlFlow = ControlFlow.NONE
+    target: Optional[int] = None
+
+    @property
+    def instr(self) -> str:
+        if self.target is None:
+            return self.text
+        return f"{self.text}{self.pc + self.target:x}"
+
+
+# Maximum number of distinct instruction words kept decoded
+DECODE_CACHE_SIZE: int = 1 << 14
+
+
+class _decoded(NamedTuple):
+    text: str
+    target: Optional[int]
     rd: int
     rs1: int
     rs2: int
+    cflow: ControlFlow
 
 
 def disassemble(instruction: int, pc: int) -> Optional[dsm]:
     """Disassemble any RISC-V instruction covered by the disassembler.
 
+    The pc-independent part of the disassembly is read from a table of every
+    16-bit word for compressed instructions, see get_compressed_table, and
+    memoized by instruction word otherwise, see decode_cache_info. The
+    control-flow class is computed along, see get_control_flow. The text of
+    pc-relative branches and jumps is only rendered when read, see dsm.
+
     Parameters
     ----------
     instruction : int
@@ -78,95 +126,336 @@ def disassemble(instruction: int, pc: int) -> Optional[dsm]:
     addi     x9,x9,-60
 
     """
-    opcode: Optional[int] = get_opcode(instruction)
+    if instruction & 0x3 != 0x3 and instruction <= 0xFFFF:
+        decoded: Optional[_decoded] = get_compressed_table()[instruction]
+    else:
+        decoded = _decode(instruction)
 
-    if opcode not in INSTR_FORMAT_BY_OPC or opcode is None:
+    if decoded is None:
         return None
 
-    if opcode in C_OPCODES:
-        instr_mnemonic, instr_format = get_c_instruction(instruction, opcode)
-    elif opcode in FDQ_OPCODES:
-        instr_mnemonic = get_fdq_instruction(instruction, opcode)
-        instr_format = "FDQ"
-    else:
-        instr_mnemonic = get_instruction(instruction, opcode)
-        instr_format = INSTR_FORMAT_BY_OPC[opcode]
+    return dsm(
+        pc=pc,
+        text=decoded.text,
+        rd=decoded.rd,
+        rs1=decoded.rs1,
+        rs2=decoded.rs2,
+        cflow=decoded.cflow,
+        target=decoded.target,
+    )
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decode(instruction: int) -> Optional[_decoded]:
+    """Disassemble an instruction independently of its pc.
+
+    The mnemonic and format are looked up in the flat decode table, see
+    lookup_instruction. For pc-relative branches and jumps, text is the
+    disassembly up to the target and target the offset of the target from
+    the pc.
 
-    if instr_mnemonic is None or instr_format is None:
+    """
+    decoded: Optional[Decoded] = lookup_instruction(instruction)
+
+    if decoded is None:
         return None
 
-    # Immediate type
-    if instr_format == "I":
-        return _i_format_analysis(instruction, pc, opcode, instr_mnemonic)
+    instr_mnemonic, instr_format = decoded
+    opcode: int = get_opcode(instruction)
 
-    # Register type
-    elif instr_format == "R":
-        return _r_format_analysis(instruction, pc, opcode, instr_mnemonic)
+    disassembled: dsm = FORMAT_ANALYSIS[instr_format](
+        instruction, 0, opcode, instr_mnemonic
+    )
+    target: Optional[int] = _get_target_offset(
+        instruction, instr_mnemonic, instr_format
+    )
 
-    # Four Registers type
-    elif instr_format == "R4":
-        return _r4_format_analysis(instruction, pc, instr_mnemonic)
+    instr_str: str = disassembled.text
+    if target is not None:
+        # With a null pc, the disassembly ends with the formatted offset
+        instr_str = instr_str[: -len(f"{target:x}")]
 
-    # Store type
-    elif instr_format == "S":
-        return _s_format_analysis(instruction, pc, instr_mnemonic)
+    return _decoded(
+        instr_str,
+        target,
+        disassembled.rd,
+        disassembled.rs1,
+        disassembled.rs2,
+        get_control_flow(instr_mnemonic, disassembled.rd, disassembled.rs1),
+    )
 
-    # Branch type
-    elif instr_format == "B":
-        return _b_format_analysis(instruction, pc, instr_mnemonic)
 
-    # Upper immediate type
-    elif instr_format == "U":
-        return _u_format_analysis(instruction, pc, instr_mnemonic)
+def get_control_flow(instr_mnemonic: str, rd: int, rs1: int) -> ControlFlow:
+    """Classify a decoded instruction by its effect on the control flow"""
 
-    # Jump type
-    elif instr_format == "J":
-        return _j_format_analysis(instruction, pc, instr_mnemonic)
+    if instr_mnemonic in ("jalr", "c.jr", "c.jalr"):
+        # Jumps through ra are returns
+        if rs1 == 1:
+            return ControlFlow.RETURN
+        if rd != 0 or instr_mnemonic == "c.jalr":
+            return ControlFlow.INDIRECT_CALL
+        return ControlFlow.INDIRECT_JUMP
 
-    # Jump type
-    elif instr_format == "FDQ":
-        return _fdq_format_analysis(instruction, pc, opcode, instr_mnemonic)
+    if instr_mnemonic in ("jal", "c.jal", "c.j"):
+        if rd != 0 or instr_mnemonic == "c.jal":
+            return ControlFlow.CALL
+        return ControlFlow.JUMP
 
-    # Compressed Register
-    elif instr_format == "CR":
-        return _cr_format_analysis(instruction, pc, instr_mnemonic)
+    if instr_mnemonic in (
+        "beq",
+        "bne",
+        "blt",
+        "bge",
+        "bltu",
+        "bgeu",
+        "c.beqz",
+        "c.bnez",
+    ):
+        return ControlFlow.BRANCH
 
-    # Compressed Immediate
-    elif instr_format == "CI":
-        return _ci_format_analysis(instruction, pc, instr_mnemonic)
+    if instr_mnemonic in ("ecall", "ebreak", "c.ebreak", "mret", "sret"):
+        return ControlFlow.TRAP
 
-    # Compressed Stack-rative Store
-    elif instr_format == "CSS":
-        return _css_format_analysis(instruction, pc, instr_mnemonic)
+    return ControlFlow.NONE
 
-    # Compressed Wide Immediate
-    elif instr_format == "CIW":
-        return _ciw_format_analysis(instruction, pc, instr_mnemonic)
 
-    # Compressed Load
-    elif instr_format == "CL":
-        return _cl_format_analysis(instruction, pc, instr_mnemonic)
+def decode_cache_info():
+    """Hits, misses and size of the cache of decoded instruction words"""
+    return _decode.cache_info()
 
-    # Compressed Store
-    elif instr_format == "CS":
-        return _cs_format_analysis(instruction, pc, instr_mnemonic)
 
-    # Compressed Arithmetic
-    elif instr_format == "CA":
-        return _ca_format_analysis(instruction, pc, instr_mnemonic)
+def decode_cache_clear() -> None:
+    """Empty the cache of decoded instruction words, see decode_cache_info"""
+    _decode.cache_clear()
 
-    # Compressed Branch
-    elif instr_format == "CB":
-        return _cb_format_analysis(instruction, pc, instr_mnemonic)
 
-    # Compressed Jump
-    elif instr_format == "CJ":
-        return _cj_format_analysis(instruction, pc, instr_mnemonic)
+@lru_cache(maxsize=None)
+def get_compressed_table() -> Tuple[Optional[_decoded], ...]:
+    """Decoding of every 16-bit word, built on the first call.
 
-    else:
-        assert (
-            False
-        ), f"Unable to find a disassembly for format {instr_mnemonic} associated with format {instr_format}."
+    Words that are not compressed instructions, i.e. ending with 0b11, are
+    mapped to None.
+
+    """
+    return tuple(
+        _decode.__wrapped__(word) if word & 0x3 != 0x3 else None
+        for word in range(0x10000)
+    )
+
+
+def _get_target_offset(
+    instruction: int, instr_mnemonic: str, instr_format: str
+) -> Optional[int]:
+    """Offset of the target of pc-relative branches and jumps, None otherwise"""
+
+    if instr_format == "B":
+        return get_b_type_imm(instruction)
+
+    if instr_format == "J":
+        return get_j_type_imm(instruction)
+
+    if instr_format == "CJ":
+        return get_jump_target(instruction)
+
+    if instr_format == "CB" and instr_mnemonic in ["c.beqz", "c.bnez"]:
+        return get_cb_offset(instruction)
+
+    return None
+
+
+class dsm_batch(NamedTuple):
+    """Decoded fields of an array of instructions, one array per field"""
+
+    valid: "np.ndarray"
+    compressed: "np.ndarray"
+    opcode: "np.ndarray"
+    funct3: "np.ndarray"
+    rd: "np.ndarray"
+    rs1: "np.ndarray"
+    rs2: "np.ndarray"
+    offset: "np.ndarray"
+    target: "np.ndarray"
+    cflow: "np.ndarray"
+
+
+def disassemble_batch(words: "np.ndarray", pcs: "np.ndarray") -> dsm_batch:
+    """Decode arrays of instruction words and their pcs at once.
+
+    Compressed and non-compressed instructions can be mixed. The opcode,
+    funct3, offset and target of pc-relative branches and jumps, and the
+    ControlFlow class are extracted with vectorized bit operations on the
+    whole arrays. rd, rs1 and rs2 follow the conventions of disassemble, they
+    are decoded once per distinct word and gathered. Fields of words that are
+    not valid instructions are null.
+
+    This requires numpy, which is only imported on the first call.
+
+    Examples
+    --------
+    >>> disassemble_batch(np.array([0x8082, 0x00b50463]), np.array([0, 4])).cflow
+    array([6, 1], dtype=uint8)
+
+    """
+    import numpy as np
+
+    w: np.ndarray = np.asarray(words, dtype=np.int64)
+    pc: np.ndarray = np.asarray(pcs, dtype=np.int64)
+
+    compressed: np.ndarray = (w & 0x3) != 0x3
+    opcode: np.ndarray = np.where(compressed, w & 0x3, w & 0x7F)
+    funct3: np.ndarray = np.where(compressed, (w & 0xE000) >> 13, (w & 0x7000) >> 12)
+
+    valid, rd, rs1, rs2 = _gather_registers(np, w, compressed)
+
+    # Same fields as get_rd, get_rs1, get_ci_cr_dest_reg, get_cr_source_reg
+    w_rd: np.ndarray = (w & 0xF80) >> 7
+    w_rs1: np.ndarray = (w & 0xF8000) >> 15
+    c_rs2: np.ndarray = (w & 0x7C) >> 2
+
+    is_jalr: np.ndarray = ~compressed & (opcode == 0x67)
+    is_jal: np.ndarray = ~compressed & (opcode == 0x6F)
+    is_branch: np.ndarray = ~compressed & (opcode == 0x63)
+    is_system: np.ndarray = ~compressed & (opcode == 0x73) & (funct3 == 0)
+    is_c_jal: np.ndarray = compressed & (opcode == 0x1) & (funct3 == 1) & (w_rd == 0)
+    is_c_j: np.ndarray = compressed & (opcode == 0x1) & (funct3 == 5)
+    is_c_branch: np.ndarray = compressed & (opcode == 0x1) & (funct3 >= 6)
+    is_c_cr: np.ndarray = compressed & (opcode == 0x2) & (funct3 == 4) & (c_rs2 == 0)
+    is_c_jr: np.ndarray = is_c_cr & ((w & 0x1000) == 0)
+    is_c_link: np.ndarray = is_c_cr & ((w & 0x1000) != 0) & (w_rd != 0)
+    is_c_ebreak: np.ndarray = is_c_cr & ((w & 0x1000) != 0) & (w_rd == 0)
+
+    # get_b_type_imm, get_j_type_imm, get_jump_target, get_cb_offset
+    b_imm: np.ndarray = _sign_extend(
+        np,
+        ((w & 0x80000000) >> 19)
+        | ((w & 0x80) << 4)
+        | ((w & 0x7E000000) >> 20)
+        | ((w & 0xF00) >> 7),
+        12,
+    )
+    j_imm: np.ndarray = _sign_extend(
+        np,
+        ((w & 0x80000000) >> 11)
+        | ((w & 0x7FE00000) >> 20)
+        | ((w & 0x100000) >> 9)
+        | (w & 0xFF000),
+        20,
+    )
+    c_j_imm: np.ndarray = _sign_extend(
+        np,
+        ((w & 0x1000) >> 1)
+        | ((w & 0x100) << 2)
+        | ((w & 0x600) >> 1)
+        | ((w & 0x40) << 1)
+        | ((w & 0x80) >> 1)
+        | ((w & 0x4) << 3)
+        | ((w & 0x800) >> 7)
+        | ((w & 0x38) >> 2),
+        11,
+    )
+    c_b_imm: np.ndarray = _sign_extend(
+        np,
+        ((w & 0x1000) >> 4)
+        | ((w & 0x60) << 1)
+        | ((w & 0x4) << 3)
+        | ((w & 0xC00) >> 7)
+        | ((w & 0x18) >> 2),
+        8,
+    )
+
+    offset: np.ndarray = np.select(
+        [is_branch, is_jal, is_c_jal | is_c_j, is_c_branch],
+        [b_imm, j_imm, c_j_imm, c_b_imm],
+        0,
+    )
+    offset = np.where(valid, offset, 0)
+    has_target: np.ndarray = valid & (
+        is_branch | is_jal | is_c_jal | is_c_j | is_c_branch
+    )
+    target: np.ndarray = np.where(has_target, pc + offset, 0)
+
+    # get_control_flow, on the registers decoded by disassemble
+    imm: np.ndarray = (w & 0xFFF00000) >> 20
+    # ecall, ebreak, sret, mret, and ebreak again as the funct7 lookup of
+    # get_instruction hits its 0x1 entry
+    trap_imm: np.ndarray = np.array([0x000, 0x001, 0x102, 0x302, *range(0x20, 0x40)])
+    cflow: np.ndarray = np.select(
+        [
+            (is_jalr | is_c_jr | is_c_link) & (rs1 == 1),
+            (is_jalr & (rd != 0)) | is_c_link,
+            is_jalr | is_c_jr,
+            (is_jal & (rd != 0)) | is_c_jal,
+            is_jal | is_c_j,
+            is_branch | is_c_branch,
+            (is_system & np.isin(imm, trap_imm)) | is_c_ebreak,
+        ],
+        [
+            ControlFlow.RETURN,
+            ControlFlow.INDIRECT_CALL,
+            ControlFlow.INDIRECT_JUMP,
+            ControlFlow.CALL,
+            ControlFlow.JUMP,
+            ControlFlow.BRANCH,
+            ControlFlow.TRAP,
+        ],
+        ControlFlow.NONE,
+    )
+    cflow = np.where(valid, cflow, ControlFlow.NONE).astype(np.uint8)
+
+    return dsm_batch(
+        valid=valid,
+        compressed=compressed,
+        opcode=opcode.astype(np.uint8),
+        funct3=funct3.astype(np.uint8),
+        rd=rd,
+        rs1=rs1,
+        rs2=rs2,
+        offset=offset,
+        target=target,
+        cflow=cflow,
+    )
+
+
+def _sign_extend(np, value: "np.ndarray", sign_bit: int) -> "np.ndarray":
+    return np.where(value >> sign_bit != 0, value - (2 << sign_bit), value)
+
+
+def _gather_registers(np, w: "np.ndarray", compressed: "np.ndarray") -> Tuple:
+    """Validity, rd, rs1 and rs2 of words, decoded once per distinct word"""
+
+    valid: np.ndarray = np.zeros(len(w), dtype=bool)
+    regs: np.ndarray = np.zeros((3, len(w)), dtype=np.uint8)
+
+    # Compressed words index the table of every 16-bit word
+    c_valid, c_regs = _get_compressed_arrays()
+    c_words: np.ndarray = w[compressed & (w <= 0xFFFF)]
+    valid[compressed & (w <= 0xFFFF)] = c_valid[c_words]
+    regs[:, compressed & (w <= 0xFFFF)] = c_regs[:, c_words]
+
+    unique, inverse = np.unique(w[~compressed], return_inverse=True)
+    decoded = [_decode(int(word)) for word in unique]
+    u_valid: np.ndarray = np.array([d is not None for d in decoded], dtype=bool)
+    u_regs: np.ndarray = np.array(
+        [(d.rd, d.rs1, d.rs2) if d else (0, 0, 0) for d in decoded], dtype=np.uint8
+    ).reshape(-1, 3)
+    valid[~compressed] = u_valid[inverse]
+    regs[:, ~compressed] = u_regs[inverse].T
+
+    return valid, regs[0], regs[1], regs[2]
+
+
+@lru_cache(maxsize=None)
+def _get_compressed_arrays() -> Tuple:
+    """get_compressed_table as a validity array and a (rd, rs1, rs2) array"""
+    import numpy as np
+
+    table = get_compressed_table()
+    valid: np.ndarray = np.array([d is not None for d in table], dtype=bool)
+    regs: np.ndarray = np.array(
+        [(d.rd, d.rs1, d.rs2) if d else (0, 0, 0) for d in table], dtype=np.uint8
+    ).T.copy()
+
+    return valid, regs
 
 
 """ Instruction's format analysis"""
@@ -185,56 +474,56 @@ def _i_format_analysis(
     # Conditions to adapt to all the different formats
     if opcode in [0x3, 0x67]:
         instr_str = f"{instr_mnemonic} \t x{rd},{i_imm}(x{rs1})"
-        return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
     if opcode == 0xF:
         if funct3 == 0x0:
             P, S = get_fence_ps(instruction)
             if P == "pause" or S == "pause":
                 instr_str = "pause"
-                return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+                return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
 
             instr_str = f"{instr_mnemonic} \t {P},{S}"
-            return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
 
         if funct3 == 0x1:
             instr_str = f"{instr_mnemonic}"
-            return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
 
     if opcode in [0x13, 0x1B]:
         if funct3 in [0x0, 0x4, 0x6, 0x7]:
             instr_str = f"{instr_mnemonic} \t x{rd},x{rs1},{i_imm}"
-            return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
         if funct3 == 0x5:
             shamt = get_i_type_shamt(instruction)
             instr_str = f"{instr_mnemonic} \t x{rd},x{rs1},{shamt:#x}"
-            return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
         if funct3 in [0x2, 0x3]:
             instr_str = f"{instr_mnemonic} \t x{rd},x{rs1},{i_imm}"
-            return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
     if opcode == 0x73:
         i_imm = get_i_type_imm(instruction, is_signed=False)
         if funct3 in [0x1, 0x2, 0x3]:
             csr = CSR_ADDR[i_imm]
             instr_str = f"{instr_mnemonic} \t x{rd},{csr},x{rs1}"
-            return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
         if funct3 in [0x5, 0x6, 0x7]:
             csr = CSR_ADDR[i_imm]
             instr_str = f"{instr_mnemonic} \t x{rd},{csr},{rs1}"
-            return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
         if funct3 in [0x0, 0x4]:
             if i_imm == 0xFC0:
                 instr_str = f"{instr_mnemonic} \t x{rs1}"
-                return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1, rs2=0)
+                return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1, rs2=0)
             instr_str = f"{instr_mnemonic}"
-            return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
 
-    return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
 
 def _r_format_analysis(
@@ -251,14 +540,14 @@ def _r_format_analysis(
             instr_str = (
                 f"{instr_mnemonic}{get_suffix_aqrl(instruction)} \t x{rd},(x{rs1})"
             )
-            return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
         instr_str = (
             f"{instr_mnemonic}{get_suffix_aqrl(instruction)} \t x{rd},x{rs2},(x{rs1})"
         )
-        return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=rs2)
+        return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=rs2)
 
-    return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=rs2)
+    return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=rs2)
 
 
 def _r4_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -268,7 +557,7 @@ def _r4_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     rd: int = get_rd(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rd},x{rs1},x{rs2},x{rs3}"
 
-    return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=rs2)
+    return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=rs2)
 
 
 def _s_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -277,7 +566,7 @@ def _s_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     s_imm: int = get_s_type_imm(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rs2},{s_imm}(x{rs1})"
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1, rs2=rs2)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1, rs2=rs2)
 
 
 def _b_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -287,7 +576,7 @@ def _b_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     branch_value: int = pc + b_imm
     instr_str: str = f"{instr_mnemonic} \t x{rs1},x{rs2},{branch_value:x}"
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1, rs2=rs2)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1, rs2=rs2)
 
 
 def _u_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -295,7 +584,7 @@ def _u_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     u_imm: int = get_u_type_imm(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rd},{u_imm:#x}"
 
-    return dsm(pc=pc, instr=instr_str, rd=rd, rs1=0, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd, rs1=0, rs2=0)
 
 
 def _j_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -304,7 +593,7 @@ def _j_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     jpt: int = j_imm + pc
     instr_str: str = f"{instr_mnemonic} \t x{rd},{jpt:x}"
 
-    return dsm(pc=pc, instr=instr_str, rd=rd, rs1=0, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd, rs1=0, rs2=0)
 
 
 def _fdq_format_analysis(
@@ -318,17 +607,17 @@ def _fdq_format_analysis(
     # Conditions to adapt to all the different formats
     if opcode == 0x7:
         instr_str = f"{instr_mnemonic} \t x{rd},{i_imm}(x{rs1})"
-        return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
     if opcode == 0x27:
         s_imm: int = get_s_type_imm(instruction)
         instr_str = f"{instr_mnemonic} \t x{rs2},{s_imm}(x{rs1})"
-        return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
     if opcode in [0x43, 0x47, 0x4B, 0x4F]:
         rs3: int = get_funct3(instruction)
         instr_str: str = f"{instr_mnemonic} \t x{rd},x{rs1},x{rs2},x{rs3}"
-        return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=rs2)
+        return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=rs2)
 
     instr_str: str = f"{instr_mnemonic} \t x{rd},x{rs1},{i_imm:#x}"
 
@@ -358,7 +647,7 @@ def _fdq_format_analysis(
     ]:
         instr_str: str = f"{instr_mnemonic} \t x{rd},x{rs1},x{rs2}"
 
-    return dsm(pc=pc, instr=instr_str, rd=rd, rs1=rs1, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd, rs1=rs1, rs2=0)
 
 
 def _cr_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -369,14 +658,14 @@ def _cr_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
 
     if instr_mnemonic == "c.mv" or instr_mnemonic == "c.add":
         instr_str = f"{instr_mnemonic} \t x{rd_rs1},x{rs2}"
-        return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=rs2)
+        return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=rs2)
 
     # c.ebreak
     if instruction == 0x9002:
         instr_str = f"{instr_mnemonic}"
-        return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=rd_rs1, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=rd_rs1, rs2=0)
 
 
 def _ci_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -390,32 +679,32 @@ def _ci_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
             get_ci_nzuimm(instruction, is_signed=False)
         )
         instr_str = f"{instr_mnemonic} \t x{rd_rs1},{ns_nzuimm:#x}"
-        return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
 
     if instr_mnemonic == "c.li":
         instr_str = f"{instr_mnemonic} \t x{rd_rs1},{nzuimm}"
-        return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
 
     if "sp" in instr_mnemonic:
         if "16" in instr_mnemonic:
             nzuimm = get_addi16sp_imm(instruction)
             instr_str = f"{instr_mnemonic} \t x{rd_rs1},{nzuimm}"
-            return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
 
         imm: int = get_ci_sp_imm(instruction)
         instr_str = f"{instr_mnemonic} \t x{rd_rs1},{imm}(x2)"
-        return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=2, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=2, rs2=0)
 
     if instr_mnemonic in ["c.addi", "c.addiw"]:
         instr_str = f"{instr_mnemonic} \t x{rd_rs1},{nzuimm}"
-        return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
 
     if instr_mnemonic in ["c.slli", "c.slli64"]:
         nzuimm = get_ci_nzuimm(instruction, is_signed=False)
         instr_str = f"{instr_mnemonic} \t x{rd_rs1},{nzuimm:#x}"
-        return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
 
-    return dsm(pc=pc, instr=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd_rs1, rs1=rd_rs1, rs2=0)
 
 
 def _css_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -423,7 +712,7 @@ def _css_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     offset: int = get_css_offset(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rs2},{offset}(x2)"
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=2, rs2=rs2)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=2, rs2=rs2)
 
 
 def _ciw_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -436,11 +725,11 @@ def _ciw_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
         imm = get_addi4spn_imm(instruction)
         if imm == 0:
             instr_str = "c.unimp"
-            return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+            return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
         instr_str = f"{instr_mnemonic} \t x{rd_p},x2,{imm}"
-        return dsm(pc=pc, instr=instr_str, rd=rd_p, rs1=2, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=rd_p, rs1=2, rs2=0)
 
-    return dsm(pc=pc, instr=instr_str, rd=rd_p, rs1=2, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd_p, rs1=2, rs2=0)
 
 
 def _cl_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -449,7 +738,7 @@ def _cl_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     offset: int = get_cl_cs_imm(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rd_p},{offset}(x{rs1_p})"
 
-    return dsm(pc=pc, instr=instr_str, rd=rd_p, rs1=rs1_p, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd_p, rs1=rs1_p, rs2=0)
 
 
 def _cs_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -458,7 +747,7 @@ def _cs_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     imm: int = get_cl_cs_imm(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rs2_p},{imm}(x{rs1_p})"
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1_p, rs2=rs2_p)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1_p, rs2=rs2_p)
 
 
 def _ca_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -466,7 +755,7 @@ def _ca_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     rs2_p: int = get_compressed_rs2_rd(instruction)
     instr_str: str = f"{instr_mnemonic} \t x{rd_p},x{rs2_p}"
 
-    return dsm(pc=pc, instr=instr_str, rd=rd_p, rs1=rs2_p, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=rd_p, rs1=rs2_p, rs2=0)
 
 
 def _cb_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
@@ -479,18 +768,41 @@ def _cb_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     if instr_mnemonic == "c.andi":
         imm: int = get_ci_nzuimm(instruction, is_signed=True)
         instr_str = f"{instr_mnemonic} \t x{rs1_p},{imm}"
-        return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1_p, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1_p, rs2=0)
 
     if instr_mnemonic in ["c.srai", "c.srai64", "c.srli", "c.srli64"]:
         imm = get_ci_nzuimm(instruction, is_signed=False)
         instr_str = f"{instr_mnemonic} \t x{rs1_p},{imm:#x}"
-        return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1_p, rs2=0)
+        return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1_p, rs2=0)
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=rs1_p, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=rs1_p, rs2=0)
 
 
 def _cj_format_analysis(instruction: int, pc: int, instr_mnemonic: str) -> dsm:
     jpt: int = get_jump_target(instruction) + pc
     instr_str: str = f"{instr_mnemonic} \t {jpt:x}"
 
-    return dsm(pc=pc, instr=instr_str, rd=0, rs1=0, rs2=0)
+    return dsm(pc=pc, text=instr_str, rd=0, rs1=0, rs2=0)
+
+
+# Analysis of each instruction format, called with (instruction, pc, opcode,
+# mnemonic)
+FORMAT_ANALYSIS: Dict[str, Callable[[int, int, int, str], dsm]] = {
+    "I": _i_format_analysis,
+    "R": _r_format_analysis,
+    "R4": lambda i, pc, _, m: _r4_format_analysis(i, pc, m),
+    "S": lambda i, pc, _, m: _s_format_analysis(i, pc, m),
+    "B": lambda i, pc, _, m: _b_format_analysis(i, pc, m),
+    "U": lambda i, pc, _, m: _u_format_analysis(i, pc, m),
+    "J": lambda i, pc, _, m: _j_format_analysis(i, pc, m),
+    "FDQ": _fdq_format_analysis,
+    "CR": lambda i, pc, _, m: _cr_format_analysis(i, pc, m),
+    "CI": lambda i, pc, _, m: _ci_format_analysis(i, pc, m),
+    "CSS": lambda i, pc, _, m: _css_format_analysis(i, pc, m),
+    "CIW": lambda i, pc, _, m: _ciw_format_analysis(i, pc, m),
+    "CL": lambda i, pc, _, m: _cl_format_analysis(i, pc, m),
+    "CS": lambda i, pc, _, m: _cs_format_analysis(i, pc, m),
+    "CA": lambda i, pc, _, m: _ca_format_analysis(i, pc, m),
+    "CB": lambda i, pc, _, m: _cb_format_analysis(i, pc, m),
+    "CJ": lambda i, pc, _, m: _cj_format_analysis(i, pc, m),
+}
@@ -5,15 +5,26 @@ Also contains useful functions to manipulate bits.
 """
 
 import math
-from typing import Optional, Tuple
+from typing import Callable, Dict, Iterator, Optional, Tuple
 
 from .riscv_instructions_table import (
     C_INSTR_BY_CODES,
+    C_OPCODES,
     CSR_ADDR,
     FDQ_INSTR_BY_CODES,
+    FDQ_OPCODES,
     INSTR_BY_CODES,
+    INSTR_FORMAT_BY_OPC,
 )
 
+# Bits selecting the decode group of compressed and non-compressed instructions:
+# opcode and funct3
+C_GROUP_MASK: int = 0xE003
+GROUP_MASK: int = 0x707F
+
+# Decoded mnemonic and format of an instruction
+Decoded = Tuple[str, str]
+
 
 def get_sign_extended_value(value: int) -> int:
     # Looking for the directly superior 2**p such as value < 2**p
@@ -224,7 +235,10 @@ def get_fdq_instruction(instr: int, opc: int) -> Optional[str]:
 
         try:
             second_table = init_table[funct7]
-            return second_table
+            if type(second_table) == str:
+                return second_table
+            funct3 = get_funct3(instr)
+            return second_table[funct3] if funct3 in second_table else None
         except KeyError:
             try:
                 imm = get_i_type_imm(instr, is_signed=False)
@@ -600,3 +614,227 @@ def get_compressed_rs1(instruction: int) -> int:
 
 def get_compressed_rs2_rd(instruction: int) -> int:
     return ((0x1C & instruction) >> 2) + 8
+
+
+""" Flat decode table """
+
+
+def _submasks(mask: int) -> Iterator[int]:
+    """Every value made of a subset of the bits of mask"""
+    sub: int = 0
+    while True:
+        yield sub
+        sub = (sub - mask) & mask
+        if sub == 0:
+            return
+
+
+def _get_group_rule(
+    opcode: int, funct3: int
+) -> Optional[Tuple[int, Callable[[int], Optional[Decoded]]]]:
+    """Discriminator bits and decoding of an RV32/RV64 (opcode, funct3) group.
+
+    The rules follow get_instruction and get_fdq_instruction.
+
+    """
+
+    if opcode in FDQ_OPCODES:
+        table = FDQ_INSTR_BY_CODES[opcode]
+        instr_format = "FDQ"
+    else:
+        table = INSTR_BY_CODES[opcode]
+        instr_format = INSTR_FORMAT_BY_OPC[opcode]
+
+    if type(table) == str:
+        return 0, lambda _: (table, instr_format)
+
+    # R4 format
+    if opcode in [0x43, 0x47, 0x4B, 0x4F]:
+        return 0x6000000, lambda i: _leaf(table.get(get_funct2(i)), instr_format)
+
+    if opcode == 0x53:
+        return 0xFFF00000, lambda i: _get_fp_op(table, i, funct3)
+
+    if funct3 not in table:
+        return None
+
+    second_table = table[funct3]
+
+    if opcode == 0x73:
+        if type(second_table) == str:
+            return 0xFFF00000, lambda i: (
+                (second_table, instr_format)
+                if get_i_type_imm(i, is_signed=False) in CSR_ADDR
+                else None
+            )
+        return 0xFFF00000, lambda i: _get_system_op(second_table, i)
+
+    if type(second_table) == str:
+        return 0, lambda _: (second_table, instr_format)
+
+    # srli, srai, srliw, sraiw: imm >= 1000 selects the arithmetic shift
+    if opcode in [0x13, 0x1B]:
+        return 0xFF800000, lambda i: (
+            second_table[32 if get_i_type_imm(i, is_signed=False) >= 1000 else 0],
+            instr_format,
+        )
+
+    # RV32A / RV64A
+    if opcode == 0x2F:
+        return 0xF8000000, lambda i: _leaf(second_table.get(get_funct5(i)), "R")
+
+    return 0xFE000000, lambda i: _leaf(
+        second_table.get(get_r_type_funct7(i)), instr_format
+    )
+
+
+def _leaf(mnemonic: Optional[str], instr_format: str) -> Optional[Decoded]:
+    return None if mnemonic is None else (mnemonic, instr_format)
+
+
+def _get_system_op(table: dict, instruction: int) -> Optional[Decoded]:
+    # Entries of the table are either a funct7 or the whole immediate
+    funct7: int = get_r_type_funct7(instruction)
+    if funct7 in table and funct7 != 0x0:
+        return table[funct7], "I"
+
+    return _leaf(table.get(get_i_type_imm(instruction, is_signed=False)), "I")
+
+
+def _get_fp_op(table: dict, instruction: int, funct3: int) -> Optional[Decoded]:
+    # Entries of the table are either a funct7 or the whole immediate
+    second_table = table.get(get_r_type_funct7(instruction))
+    if second_table is None:
+        second_table = table.get(get_i_type_imm(instruction, is_signed=False))
+
+    if type(second_table) == dict:
+        second_table = second_table.get(funct3)
+
+    return _leaf(second_table, "FDQ")
+
+
+def _get_c_group_rule(
+    opcode: int, funct3: int
+) -> Optional[Tuple[int, Callable[[int], Optional[Decoded]]]]:
+    """Discriminator bits and decoding of a compressed (opcode, funct3) group.
+
+    The rules follow get_c_instruction.
+
+    """
+
+    table = C_INSTR_BY_CODES[opcode]
+
+    if funct3 not in table:
+        return None
+
+    second_table = table[funct3]
+
+    if type(second_table) == tuple:
+        return 0, lambda _: second_table
+
+    if opcode == 0x1 and funct3 == 1:
+        # c.jal, c.addiw
+        return 0xF80, lambda i: second_table[0 if get_ci_cr_dest_reg(i) == 0 else 1]
+
+    if opcode == 0x1 and funct3 == 3:
+        # c.addi16sp, c.lui
+        return 0xF80, lambda i: second_table[2 if get_ci_cr_dest_reg(i) == 2 else 1]
+
+    if opcode == 0x1 and funct3 == 4:
+        return 0x1C7C, lambda i: _get_c_alu_op(second_table, i)
+
+    if opcode == 0x2 and funct3 == 0:
+        # c.slli64, c.slli
+        return (
+            0x107C,
+            lambda i: second_table[0 if get_ci_nzuimm(i, is_signed=False) == 0 else 1],
+        )
+
+    # c.jr, c.mv, c.ebreak, c.jalr, c.add
+    return 0x1FFC, lambda i: _get_c_jump_op(second_table, i)
+
+
+def _get_c_alu_op(table: dict, instruction: int) -> Optional[Decoded]:
+    f6: int = get_compressed_funct6(instruction)
+    if f6 not in table:
+        return None
+
+    third_table = table[f6]
+    if f6 in [0x20, 0x21]:
+        return third_table[0 if get_ci_nzuimm(instruction, is_signed=True) == 0 else 1]
+    if f6 in [0x23, 0x27]:
+        return third_table.get(get_compressed_funct2(instruction))
+
+    return third_table
+
+
+def _get_c_jump_op(table: dict, instruction: int) -> Optional[Decoded]:
+    f4: int = get_compressed_funct4(instruction)
+    if f4 not in table:
+        return None
+
+    third_table = table[f4]
+    if get_cr_source_reg(instruction) != 0:
+        return third_table[1]
+    if f4 == 0x8:
+        return third_table[0]
+
+    return third_table[0][0 if get_ci_cr_dest_reg(instruction) == 0 else 1]
+
+
+def _build_decode_table() -> Dict[int, Tuple[int, Dict[int, Decoded]]]:
+    """Flatten the instruction tables into decode groups.
+
+    Groups are indexed by the opcode and funct3 bits of an instruction and hold
+    the mask of the bits left to discriminate between its instructions, along
+    with the decoding of every value of these bits.
+
+    """
+
+    table: Dict[int, Tuple[int, Dict[int, Decoded]]] = {}
+
+    for opcode in INSTR_FORMAT_BY_OPC:
+        for funct3 in range(8):
+            if opcode in C_OPCODES:
+                key: int = opcode | funct3 << 13
+                rule = _get_c_group_rule(opcode, funct3)
+            else:
+                key = opcode | funct3 << 12
+                rule = _get_group_rule(opcode, funct3)
+
+            if rule is None:
+                continue
+
+            mask, decode = rule
+            entries: Dict[int, Decoded] = {}
+            for sub in _submasks(mask):
+                decoded: Optional[Decoded] = decode(key | sub)
+                if decoded is not None:
+                    entries[sub] = decoded
+
+            if entries:
+                table[key] = (mask, entries)
+
+    return table
+
+
+DECODE_TABLE: Dict[int, Tuple[int, Dict[int, Decoded]]] = _build_decode_table()
+
+
+def lookup_instruction(instruction: int) -> Optional[Decoded]:
+    """Mnemonic and format of an instruction, looked up in DECODE_TABLE"""
+
+    if instruction & 0x3 == 0x3:
+        if instruction > 0xFFFFFFFF:
+            return None
+        group = DECODE_TABLE.get(instruction & GROUP_MASK)
+    else:
+        if instruction > 0xFFFF:
+            return None
+        group = DECODE_TABLE.get(instruction & C_GROUP_MASK)
+
+    if group is None:
+        return None
+
+    mask, entries = group
+    return entries.get(instruction & mask)
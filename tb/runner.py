@@ -1,17 +1,511 @@
+import fcntl
+import hashlib
+import itertools
+import json
+import logging
 import os
+import re
+import shutil
+import subprocess
 import sys
-from typing import Dict, List
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
+import cocotb
 from cocotb.runner import Simulator, get_runner
 
+_logger: logging.Logger = logging.getLogger("aspycot.runner")
+
 tests_dir: str = os.path.dirname(__file__)
 sw_dir: str = os.path.abspath(os.path.join(tests_dir, "..", "sw"))
 
+# Default directory of the cached builds of the IPs, see build
+BUILD_CACHE_DIR: str = os.path.join(tests_dir, "sim_build")
+
+# Default size of the build cache, in MiB
+BUILD_CACHE_SIZE: int = 4096
+
+# File marking a complete build, whose mtime is the last use of the build
+BUILD_MARKER: str = ".aspycot_build"
+
+# Default directory of the simulations, one per worker and parameter set
+RUN_DIR: str = os.path.join(tests_dir, "sim_run")
+
+# Commands printing the version of the simulators
+SIM_VERSION_COMMANDS: Dict[str, List[str]] = {
+    "verilator": ["verilator", "--version"],
+    "icarus": ["iverilog", "-V"],
+}
+
+# Suffix of the toplevel instantiating an IP once per parameter set
+MULTI_SUFFIX: str = "_multi"
+
+# Suffix of the toplevel setting parameters of an IP at runtime
+RUNTIME_SUFFIX: str = "_runtime"
+
+# Ports of an ANSI module header, e.g. "input logic [7:0] data_i,"
+PORT_RE = re.compile(
+    r"^\s*(input|output)\s+(?:logic|wire|reg)?\s*(\[[^\]]*\])?\s*(\w+)", re.M
+)
+
+# Parameters of a module header, e.g. "parameter int unsigned Width = 32"
+PARAMETER_RE = re.compile(r"^\s*(?:parameter\s+)?(.*?)\s*\b(\w+)\s*=\s*(.+?)\s*$", re.S)
+
+
+def is_runtime() -> bool:
+    """Whether the swept parameters of the IPs are set at runtime"""
+    return os.getenv("ASPYCOT_RUNTIME", "0") != "0"
+
+
+def get_ip(toplevel: str) -> str:
+    """IP simulated by a toplevel, possibly generated by this module"""
+    return toplevel.removesuffix(MULTI_SUFFIX).removesuffix(RUNTIME_SUFFIX)
+
+
+def get_parameter_sets(values: Dict[str, List[int]]) -> List[Dict[str, int]]:
+    """Every combination of the values of the parameters of an IP"""
+    return [dict(zip(values, p)) for p in itertools.product(*values.values())]
+
+
+def get_sources(ip: str, rtl_dir: str) -> List[str]:
+    """HDL sources of an IP, from its file list"""
+
+    # All IPs must define a file list to ease compile process
+    with open(f"{rtl_dir}/Flist.{ip}") as flist:
+        return [os.path.join(rtl_dir, f.strip()) for f in flist if f.strip()]
+
+
+def get_header(ip: str, sources: List[str]) -> Tuple[str, str, re.Match]:
+    """Source defining the IP toplevel, its content and the match of its header.
+
+    The groups of the match are the parameter list, if any, and the port list.
+
+    """
+
+    header_re = re.compile(
+        rf"\bmodule\s+{ip}\b\s*(?:#\s*\((.*?)\)\s*)?\((.*?)\)\s*;", re.S
+    )
+
+    for source in sources:
+        with open(source, "r") as f:
+            content: str = f.read()
+        match = header_re.search(content)
+        if match:
+            return source, content, match
+
+    raise ValueError(f"Module {ip} not found in {', '.join(sources)}")
+
+
+def get_ports(ip: str, sources: List[str]) -> List[Tuple[str, str, str]]:
+    """Direction, packed range and name of the ports of the IP toplevel"""
+
+    _, _, match = get_header(ip, sources)
+    return [
+        (direction, width or "", name)
+        for direction, width, name in PORT_RE.findall(match.group(2))
+    ]
+
+
+def get_parameters(ip: str, sources: List[str]) -> List[Tuple[str, str, str]]:
+    """Type, name and default value of the parameters of the IP toplevel"""
+
+    _, _, match = get_header(ip, sources)
+    declarations: str = re.sub(r"//.*", "", match.group(1) or "")
+
+    parameters: List[Tuple[str, str, str]] = []
+    for declaration in split_list(declarations):
+        found = PARAMETER_RE.match(declaration)
+        if found:
+            kind, name, default = found.groups()
+            parameters.append((kind or "int", name, default))
+
+    return parameters
+
+
+def split_list(text: str) -> List[str]:
+    """Split a comma separated list, except within brackets"""
+
+    items: List[str] = [""]
+    depth: int = 0
+    for c in text:
+        if c in "([{":
+            depth += 1
+        elif c in ")]}":
+            depth -= 1
+        if c == "," and not depth:
+            items.append("")
+        else:
+            items[-1] += c
+
+    return [item for item in items if item.strip()]
+
+
+def get_multi_top(
+    ip: str, parameter_sets: List[Dict[str, int]], sources: List[str]
+) -> str:
+    """Toplevel instantiating the IP once per parameter set.
+
+    Inputs are shared by all the instances, and output port of instance i is
+    port_i. The ranges of the ports must not depend on the parameters of the
+    IP. The toplevel is named after MULTI_SUFFIX.
+
+    """
+
+    ports: List[Tuple[str, str, str]] = get_ports(ip, sources)
+    top: str = f"{ip}{MULTI_SUFFIX}"
+
+    declarations: List[str] = []
+    for direction, width, name in ports:
+        if direction == "input":
+            declarations.append(" ".join(filter(None, ["input logic", width, name])))
+        else:
+            declarations.extend(
+                " ".join(filter(None, ["output logic", width, f"{name}_{i}"]))
+                for i in range(len(parameter_sets))
+            )
+
+    lines: List[str] = [
+        "// Generated by tb/runner.py, do not edit",
+        f"module {top} (",
+        ",\n".join(f"  {d}" for d in declarations),
+        ");",
+        "",
+    ]
+
+    for i, parameters in enumerate(parameter_sets):
+        values: str = ", ".join(f".{k}({v})" for k, v in parameters.items())
+        connections: str = ",\n".join(
+            f"    .{name}({name if direction == 'input' else f'{name}_{i}'})"
+            for direction, _, name in ports
+        )
+        lines += [f"  {ip} #({values}) u_{i} (", connections, "  );", ""]
+
+    lines.append("endmodule")
+
+    return "\n".join(lines) + "\n"
+
+
+def get_runtime_ip(ip: str, runtime: List[str], sources: List[str]) -> Tuple[str, str]:
+    """Source of the IP toplevel with the runtime parameters turned into inputs.
+
+    Returns the path of the source, to be replaced by the returned content.
+    The runtime parameters must only be used as values, not in ranges or
+    generate blocks.
+
+    """
+
+    source, content, match = get_header(ip, sources)
+    parameters: List[Tuple[str, str, str]] = get_parameters(ip, sources)
+
+    missing: List[str] = sorted(set(runtime) - {name for _, name, _ in parameters})
+    if missing:
+        raise ValueError(f"Module {ip} has no parameter {', '.join(missing)}")
+
+    kept: List[str] = [
+        f"  parameter {kind} {name} = {default}"
+        for kind, name, default in parameters
+        if name not in runtime
+    ]
+    inputs: List[str] = [
+        f"  input {kind} {name}" for kind, name, _ in parameters if name in runtime
+    ]
+
+    header: str = f"module {ip} "
+    if kept:
+        header += "#(\n" + ",\n".join(kept) + "\n) "
+    header += (
+        f"({match.group(2).rstrip()},\n\n"
+        "  // Parameters set at runtime, see tb/runner.py\n"
+        + ",\n".join(inputs)
+        + "\n);"
+    )
+
+    return source, content[: match.start()] + header + content[match.end() :]
+
+
+def get_runtime_top(ip: str, runtime: List[str], sources: List[str]) -> str:
+    """Toplevel setting the runtime parameters of the IP from plusargs.
+
+    The runtime parameters are registers of the toplevel, set to +Name=value
+    or to their default value at the start of the simulation, driving the
+    inputs added by get_runtime_ip. The other parameters are parameters of
+    the toplevel. The toplevel is named after RUNTIME_SUFFIX.
+
+    """
+
+    ports: List[Tuple[str, str, str]] = get_ports(ip, sources)
+    parameters: List[Tuple[str, str, str]] = get_parameters(ip, sources)
+    top: str = f"{ip}{RUNTIME_SUFFIX}"
+
+    kept: List[str] = [
+        f"  parameter {kind} {name} = {default}"
+        for kind, name, default in parameters
+        if name not in runtime
+    ]
+    declarations: List[str] = [
+        " ".join(filter(None, [f"{direction} logic", width, name]))
+        for direction, width, name in ports
+    ]
+
+    lines: List[str] = ["// Generated by tb/runner.py, do not edit", f"module {top} "]
+    if kept:
+        lines[-1] += "#("
+        lines += [",\n".join(kept), ") "]
+    lines[-1] += "("
+    lines += [",\n".join(f"  {d}" for d in declarations), ");", ""]
+
+    lines += [f"  {kind} {name};" for kind, name, _ in parameters if name in runtime]
+    lines += ["", "  initial begin"]
+    lines += [
+        f'    if (!$value$plusargs("{name}=%d", {name})) {name} = {default};'
+        for _, name, default in parameters
+        if name in runtime
+    ]
+    lines += ["  end", ""]
+
+    values: str = ", ".join(
+        f".{name}({name})" for _, name, _ in parameters if name not in runtime
+    )
+    connections: str = ",\n".join(
+        [f"    .{name}({name})" for _, _, name in ports]
+        + [f"    .{name}({name})" for _, name, _ in parameters if name in runtime]
+    )
+    lines += [
+        f"  {ip} {f'#({values}) ' if values else ''}u_{ip} (",
+        connections,
+        "  );",
+        "",
+        "endmodule",
+    ]
+
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_simulator_version(sim: str) -> str:
+    """Version of a simulator, as printed by its executable"""
+
+    command: List[str] = SIM_VERSION_COMMANDS.get(sim, [sim, "--version"])
+    try:
+        return subprocess.run(
+            command, capture_output=True, text=True, check=False
+        ).stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+def get_build_key(
+    sim: str,
+    toplevel: str,
+    sources: List[str],
+    generated: Dict[str, str],
+    parameters: Dict[str, int],
+    waves: bool,
+) -> str:
+    """Hash of everything a build depends on"""
+
+    digest = hashlib.blake2b(digest_size=8)
+
+    for source in sources:
+        digest.update(os.path.basename(source).encode())
+        with open(source, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    for name, content in sorted(generated.items()):
+        digest.update(name.encode())
+        digest.update(hashlib.sha256(content.encode()).digest())
+
+    digest.update(
+        json.dumps(
+            {
+                "sim": sim,
+                "version": get_simulator_version(sim),
+                "cocotb": cocotb.__version__,
+                "toplevel": toplevel,
+                "parameters": parameters,
+                "waves": waves,
+            },
+            sort_keys=True,
+        ).encode()
+    )
+
+    return digest.hexdigest()
+
+
+def get_build_size(build_dir: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(build_dir)
+        for f in files
+    )
+
+
+@contextmanager
+def locked(path: str, operation: int = fcntl.LOCK_EX) -> Iterator[bool]:
+    """Hold a lock on path, yielding whether it is held.
+
+    operation is fcntl.LOCK_EX or fcntl.LOCK_SH, possibly with fcntl.LOCK_NB,
+    in which case the lock is not held if another process holds it.
+
+    """
+
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, operation)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def evict_builds(cache_dir: str, size: int, keep: str) -> None:
+    """Remove the least recently used builds until the cache fits in size.
+
+    Builds being built or used by another test are not removed.
+
+    """
+
+    builds: List[Tuple[float, int, str]] = []
+    for name in os.listdir(cache_dir):
+        build_dir: str = os.path.join(cache_dir, name)
+        marker: str = os.path.join(build_dir, BUILD_MARKER)
+        if os.path.isfile(marker):
+            builds.append(
+                (os.path.getmtime(marker), get_build_size(build_dir), build_dir)
+            )
+
+    total: int = sum(b[1] for b in builds)
+    for _, build_size, build_dir in sorted(builds):
+        if total <= size:
+            break
+        if build_dir == keep:
+            continue
+
+        marker = os.path.join(build_dir, BUILD_MARKER)
+        with locked(f"{build_dir}.lock", fcntl.LOCK_EX | fcntl.LOCK_NB) as free:
+            if not free:
+                continue
+            with locked(marker, fcntl.LOCK_EX | fcntl.LOCK_NB) as unused:
+                if not unused:
+                    continue
+                _logger.info(f"Evicting build : {build_dir}")
+                shutil.rmtree(build_dir, ignore_errors=True)
+                total -= build_size
+
+
+@contextmanager
+def build(
+    runner: Simulator,
+    sim: str,
+    toplevel: str,
+    sources: List[str],
+    generated: Optional[Dict[str, str]] = None,
+    parameters: Optional[Dict[str, int]] = None,
+    waves: bool = False,
+) -> Iterator[str]:
+    """Build toplevel, or reuse a build of the same sources, yielding its directory.
+
+    Builds are stored in the build cache, ASPYCOT_BUILD_CACHE or tb/sim_build,
+    under a key hashing the sources, the sources generated as name: content,
+    the parameters, the simulator and its version and the build flags. The
+    least recently used builds are evicted past ASPYCOT_BUILD_CACHE_SIZE MiB.
+
+    The cache may be shared by concurrent tests: a build is made by a single
+    process holding <build>.lock, and is not evicted while a test uses it,
+    which lasts until the context exits.
+
+    """
+
+    generated = generated or {}
+    parameters = parameters or {}
+
+    cache_dir: str = os.getenv("ASPYCOT_BUILD_CACHE", BUILD_CACHE_DIR)
+    key: str = get_build_key(sim, toplevel, sources, generated, parameters, waves)
+    build_dir: str = os.path.join(cache_dir, f"{toplevel}-{key}")
+    marker: str = os.path.join(build_dir, BUILD_MARKER)
+    built: bool = False
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    with ExitStack() as stack:
+        with locked(f"{build_dir}.lock"):
+            if os.path.isfile(marker):
+                _logger.info(f"Reusing build : {build_dir}")
+                os.utime(marker)
+            else:
+                os.makedirs(build_dir, exist_ok=True)
+
+                for name, content in generated.items():
+                    path: str = os.path.join(build_dir, name)
+                    with open(path, "w") as f:
+                        f.write(content)
+                    sources = sources + [path]
+
+                runner.build(
+                    verilog_sources=sources,
+                    hdl_toplevel=toplevel,
+                    always=True,
+                    build_dir=build_dir,
+                    parameters=parameters,
+                    waves=waves,
+                )
+
+                # Only complete builds are reused
+                with open(marker, "w") as f:
+                    f.write(key)
+                built = True
+
+            # Taken before the build can be evicted by another process
+            stack.enter_context(locked(marker, fcntl.LOCK_SH))
+
+        if built:
+            size: int = (
+                int(os.getenv("ASPYCOT_BUILD_CACHE_SIZE", BUILD_CACHE_SIZE)) << 20
+            )
+            with locked(os.path.join(cache_dir, ".lock")):
+                evict_builds(cache_dir, size, build_dir)
+
+        yield build_dir
+
+
+def get_test_dir(
+    toplevel: str, parameters: Union[Dict[str, int], List[Dict[str, int]]]
+) -> str:
+    """Directory of a simulation, one per pytest-xdist worker and parameter set.
+
+    Simulations run in ASPYCOT_RUN_DIR or tb/sim_run, so that the results and
+    waveforms of concurrent tests sharing a build do not overwrite each other.
+
+    """
+
+    digest: str = hashlib.blake2b(
+        json.dumps(parameters, sort_keys=True).encode(), digest_size=4
+    ).hexdigest()
+
+    return os.path.join(
+        os.getenv("ASPYCOT_RUN_DIR", RUN_DIR),
+        os.getenv("PYTEST_XDIST_WORKER", "main"),
+        f"{toplevel}-{digest}",
+    )
+
 
 def run_tests(
-    ip: str, parameters: Dict[str, int], path: str, sim: str = "verilator"
+    ip: str,
+    parameters: Dict[str, int],
+    path: str,
+    sim: str = "verilator",
+    runtime: Optional[List[str]] = None,
 ) -> None:
-    """Compile IP and run cocotb tests using runners."""
+    """Compile IP and run cocotb tests using runners.
+
+    The parameters listed in runtime are set when the simulation starts
+    instead of when the IP is built, see get_runtime_top, so that every value
+    of these parameters shares the same build.
+
+    """
 
     rtl_dir: str = os.path.abspath(os.path.join(tests_dir, "..", "ips", path))
     sys.path.append(str(tests_dir))
@@ -22,24 +516,82 @@ def run_tests(
     module: str = "testbench"
     toplevel: str = ip
 
-    verilog_sources: List[str] = []
-
-    # All IPs must define a file list to ease compile process
-    with open(f"{rtl_dir}/Flist.{dut}") as flist:
-        for f in flist:
-            verilog_sources.append(os.path.join(rtl_dir, f))
+    verilog_sources: List[str] = get_sources(dut, rtl_dir)
+    generated: Dict[str, str] = {}
+    plusargs: List[str] = []
+    extra_env: Dict[str, str] = {}
 
-    sim_build: str = os.path.join(tests_dir, f"{dut}_sim_build")
+    if runtime:
+        toplevel = f"{ip}{RUNTIME_SUFFIX}"
+        source, content = get_runtime_ip(ip, runtime, verilog_sources)
+        generated = {
+            os.path.basename(source): content,
+            f"{toplevel}.sv": get_runtime_top(ip, runtime, verilog_sources),
+        }
+        verilog_sources = [s for s in verilog_sources if s != source]
+        plusargs = [f"+{k}={v}" for k, v in parameters.items() if k in runtime]
+        # The registers of the toplevel are only set once the simulation runs
+        extra_env = {"ASPYCOT_PARAMETER_SETS": json.dumps([parameters])}
 
     runner: Simulator = get_runner(simulator_name=sim)
 
-    runner.build(
-        verilog_sources=verilog_sources,
-        hdl_toplevel=toplevel,
-        always=True,
-        build_dir=sim_build,
-        parameters=parameters,
+    with build(
+        runner,
+        sim,
+        toplevel,
+        verilog_sources,
+        generated=generated,
+        parameters={k: v for k, v in parameters.items() if k not in (runtime or [])},
         waves=waves,
-    )
+    ) as sim_build:
+        runner.test(
+            hdl_toplevel=toplevel,
+            test_module=module,
+            waves=waves,
+            build_dir=sim_build,
+            test_dir=get_test_dir(toplevel, parameters),
+            plusargs=plusargs,
+            extra_env=extra_env,
+        )
+
+
+def run_multi_tests(
+    ip: str,
+    parameter_sets: List[Dict[str, int]],
+    path: str,
+    sim: str = "verilator",
+) -> None:
+    """Compile one instance of IP per parameter set and run cocotb tests once.
+
+    All the instances are driven by the same stimulus, so that a single parse
+    of the traces and a single simulation cover the parameter sets, which are
+    passed to the testbench through ASPYCOT_PARAMETER_SETS.
+
+    """
+
+    rtl_dir: str = os.path.abspath(os.path.join(tests_dir, "..", "ips", path))
+    sys.path.append(str(tests_dir))
+
+    waves: bool = bool(os.getenv("ASPYCOT_WAVES", 0))
+
+    module: str = "testbench"
+    toplevel: str = f"{ip}{MULTI_SUFFIX}"
+
+    verilog_sources: List[str] = get_sources(ip, rtl_dir)
+    generated: Dict[str, str] = {
+        f"{toplevel}.sv": get_multi_top(ip, parameter_sets, verilog_sources)
+    }
+
+    runner: Simulator = get_runner(simulator_name=sim)
 
-    runner.test(hdl_toplevel=toplevel, test_module=module, waves=waves)
+    with build(
+        runner, sim, toplevel, verilog_sources, generated=generated, waves=waves
+    ) as sim_build:
+        runner.test(
+            hdl_toplevel=toplevel,
+            test_module=module,
+            waves=waves,
+            build_dir=sim_build,
+            test_dir=get_test_dir(toplevel, parameter_sets),
+            extra_env={"ASPYCOT_PARAMETER_SETS": json.dumps(parameter_sets)},
+        )
@@ -0,0 +1,93 @@
+"""Live Spike runs streaming their commit log to the testbench.
+
+Instead of reading back a log written to disk, Spike is launched with its log
+on a pipe that the testbench consumes while the ISS is still running. The pipe
+buffer bounds the amount of log in flight: Spike blocks when the testbench
+falls behind.
+"""
+
+import fcntl
+import logging
+import os
+import select
+import shlex
+import subprocess
+from contextlib import contextmanager
+from typing import IO, Iterator, List
+
+_logger: logging.Logger = logging.getLogger("aspycot.spike")
+
+# Size requested for the log pipe, capped by /proc/sys/fs/pipe-max-size
+PIPE_SIZE: int = 1 << 20
+
+
+def is_live() -> bool:
+    """Whether applications are run on Spike along with the HDL simulation"""
+    return os.getenv("ASPYCOT_LIVE", "0") != "0"
+
+
+def get_spike_cmd(elf: str, log: str) -> List[str]:
+    """Spike command line logging the execution of elf to log"""
+
+    spike: List[str] = shlex.split(os.getenv("ASPYCOT_SPIKE", "spike --isa=rv64gc"))
+    return [*spike, "-l", "--log-commits", f"--log={log}", elf]
+
+
+def _is_hung_up(fd: int) -> bool:
+    """Whether the write end of the pipe fd is closed"""
+
+    poll: select.poll = select.poll()
+    poll.register(fd, select.POLLIN)
+    return any(events & select.POLLHUP for _, events in poll.poll(0))
+
+
+@contextmanager
+def spike_log_stream(elf: str) -> Iterator[IO[bytes]]:
+    """Run Spike on elf, yielding its commit log as a binary stream.
+
+    The program output is written to <elf>.out as the sw Makefile does. Spike
+    is terminated if the stream is left before the end of the execution, and
+    subprocess.CalledProcessError is raised if it fails, as its log is then
+    truncated.
+
+    """
+
+    read_fd, write_fd = os.pipe()
+
+    try:
+        fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+    except (AttributeError, OSError):
+        pass
+
+    cmd: List[str] = get_spike_cmd(elf, f"/dev/fd/{write_fd}")
+    _logger.info(f"Running: {' '.join(cmd)}")
+
+    try:
+        with open(f"{elf}.out", "wb") as out:
+            proc: subprocess.Popen = subprocess.Popen(
+                cmd, stdout=out, pass_fds=(write_fd,)
+            )
+    except OSError:
+        os.close(read_fd)
+        os.close(write_fd)
+        raise
+
+    # Only Spike holds the write end, so that its exit ends the stream
+    os.close(write_fd)
+
+    try:
+        with open(read_fd, "rb") as log:
+            yield log
+            # Spike closes its log when it ends, but may not have exited yet
+            if _is_hung_up(read_fd):
+                proc.wait()
+    finally:
+        terminated: bool = proc.poll() is None
+        if terminated:
+            proc.terminate()
+        proc.wait()
+
+    # Once terminated, the code only tells that the stream was left early
+    if proc.returncode and not terminated:
+        _logger.error(f"Spike exited with code {proc.returncode}")
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
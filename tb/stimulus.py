@@ -0,0 +1,173 @@
+"""Run-length compression of the stimulus driven on the IPs.
+
+Consecutive instructions driving the same values on the inputs of an IP are
+merged into runs, executed by the wrapper with a single await. The oracle is
+only checked at the end of a run, so runs are split wherever the exception
+signals of the IP may rise, see Wrapper.can_raise.
+
+Runs can be built by a thread ahead of the simulation, see prefetch.
+"""
+
+import logging
+import os
+import queue
+import threading
+from typing import (
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from arch import Instruction
+from wrappers import Wrapper
+
+_logger: logging.Logger = logging.getLogger("aspycot.stimulus")
+
+# Number of items handed over at once by the prefetch thread
+BATCH_SIZE: int = 4096
+
+# Number of batches the prefetch thread may build ahead of the simulation
+QUEUE_DEPTH: int = 16
+
+T = TypeVar("T")
+
+
+class Run(NamedTuple):
+    """cycles consecutive instructions driving stimulus, the last being instr"""
+
+    stimulus: Hashable
+    cycles: int
+    instr: Instruction
+    count: int
+
+
+def is_run_length() -> bool:
+    """Whether runs of identical stimulus are executed with a single await"""
+    return os.getenv("ASPYCOT_RUNS", "1") != "0"
+
+
+def is_prefetch() -> bool:
+    """Whether stimulus is built by a thread ahead of the simulation"""
+    return os.getenv("ASPYCOT_PREFETCH", "1") != "0"
+
+
+def get_runs(
+    wrapper: Wrapper, instructions: Iterable[Tuple[Instruction, int]]
+) -> Iterator[Run]:
+    """Merge instructions, as yielded by parser.get_app_instr, into runs.
+
+    A cycle that may raise an exception is a run of its own, and so is the
+    cycle after it since the exception may only be read one cycle later.
+    Other cycles are merged with the ones before them driving the same
+    stimulus, as exceptions cannot rise during them.
+
+    """
+
+    merge: bool = is_run_length()
+    current: Hashable = None
+    cycles: int = 0
+    last: Optional[Tuple[Instruction, int]] = None
+    closed: bool = True
+    raised: bool = False
+
+    for instr, count in instructions:
+        stimulus: Hashable = wrapper.stimulus(instr)
+
+        if closed or stimulus != current:
+            if last is not None:
+                yield Run(current, cycles, *last)
+            current, cycles = stimulus, 0
+            closed = raised or not merge
+
+        cycles += 1
+        last = instr, count
+
+        raised = wrapper.can_raise(stimulus)
+        closed = closed or raised
+
+    if last is not None:
+        yield Run(current, cycles, *last)
+
+
+def _produce(
+    items: Iterable[T],
+    batches: "queue.Queue[Union[List[T], BaseException, None]]",
+    stop: threading.Event,
+) -> None:
+    """Put items into batches by lists of BATCH_SIZE, then None or the error"""
+
+    def put(batch: Union[List[T], BaseException, None]) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    iterator: Iterator[T] = iter(items)
+
+    try:
+        batch: List[T] = []
+        for item in iterator:
+            batch.append(item)
+            if len(batch) == BATCH_SIZE:
+                if not put(batch):
+                    return
+                batch = []
+        if batch and not put(batch):
+            return
+    except BaseException as e:
+        put(e)
+        return
+    finally:
+        # Release the resources of the generators, e.g. a Spike process
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+    put(None)
+
+
+def prefetch(items: Iterable[T]) -> Iterator[T]:
+    """Iterate over items built by a thread, up to QUEUE_DEPTH batches ahead.
+
+    Parsing and decoding the trace then overlap with the HDL simulation, which
+    runs without holding the GIL. Exceptions raised while building items are
+    raised again by the iterator, and closing it stops the thread. Items are
+    built in the calling thread if ASPYCOT_PREFETCH is set to 0.
+
+    """
+
+    if not is_prefetch():
+        yield from items
+        return
+
+    batches: "queue.Queue[Union[List[T], BaseException, None]]" = queue.Queue(
+        QUEUE_DEPTH
+    )
+    stop: threading.Event = threading.Event()
+    producer: threading.Thread = threading.Thread(
+        target=_produce, args=(items, batches, stop), name="aspycot-prefetch"
+    )
+    producer.daemon = True
+    producer.start()
+
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            yield from batch
+    finally:
+        stop.set()
+        producer.join()
+        _logger.debug("Prefetch thread stopped")
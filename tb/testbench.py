@@ -1,13 +1,17 @@
-from parser import get_app_instr, get_apps_path
+from parser import get_app_instr, get_app_range, get_apps_path, prepare_app
 from typing import List
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.regression import TestFactory
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, Timer
 from oracle import Oracle, get_oracle
+from stimulus import get_runs, prefetch
 from wrappers import Wrapper, wrap
 
+# Clock period, in ns
+CLOCK_PERIOD: int = 10
+
 
 async def run_app(dut, app: str) -> None:
     """Run trace of an application on hardware IP"""
@@ -17,26 +21,51 @@ async def run_app(dut, app: str) -> None:
 
     # Wrap dut in abstract class to retrieve its specific functions
     wrapper: Wrapper = wrap(dut)
-    oracle: Oracle = get_oracle(dut, app)
+    oracle: Oracle = get_oracle(dut, app, wrapper.instances)
 
     await wrapper.init()
     await wrapper.reset_toggle()
 
     # Start clock
-    cocotb.start_soon(Clock(dut.clk_i, period=10, units="ns").start())
+    cocotb.start_soon(Clock(dut.clk_i, period=CLOCK_PERIOD, units="ns").start())
 
     await ClockCycles(dut.clk_i, 5)
 
-    # Parse trace and execute instructions
-    for instr, cycle in get_app_instr(path):
-        await wrapper.execute_instr(instr)
+    start, end = get_app_range()
+
+    # Decode the trace before the prefetch thread starts, as it may fork
+    prepare_app(path, start)
+
+    # Monitor IP exception signals while driving the trace
+    monitor = cocotb.start_soon(oracle.monitor(wrapper, CLOCK_PERIOD, start))
+
+    # Parse trace and execute runs of instructions driving the same stimulus,
+    # built by a thread while the simulator executes the previous ones
+    instr, cycle = None, None
+    for stimulus, cycles, instr, cycle in prefetch(
+        get_runs(wrapper, get_app_instr(path, start, end))
+    ):
+        await wrapper.execute_run(stimulus, cycles)
 
-        # Monitor IP exception signals
-        if await oracle.check_exit_condition(wrapper):
+        # Set by the monitor, without reading any signal
+        if oracle.early_exit:
             dut._log.info(f"Ending test at instruction: {instr}")
             break
 
-    dut._log.info(f"Processed instruction count : {cycle}") if cycle else ()
+    # Let the monitor see an exception raised by the last clock edge
+    await Timer(1, units="ns")
+    monitor.kill()
+
+    for i, exit_index in enumerate(oracle.exit_indexes):
+        if exit_index is not None:
+            dut._log.info(
+                f"{wrapper.label(i)}Exception raised by instruction {exit_index}"
+            )
+
+    # start is past the end of the trace
+    assert cycle is not None, f"No instruction of {app} in range {start}:{end or ''}"
+
+    dut._log.info(f"Processed instruction count : {cycle}")
     oracle.decision(wrapper)
 
 
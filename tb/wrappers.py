@@ -1,17 +1,51 @@
+import json
+import os
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Type
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Type
 
 import cocotb
 from arch import Instruction
 from models import ThreatModel
-from cocotb.triggers import RisingEdge, Timer
+from cocotb.triggers import ClockCycles, Timer
+from runner import MULTI_SUFFIX, get_ip
 
 
 class Wrapper(ABC):
+    # Parameters of the IP, read from the toplevel
+    parameters: Tuple[str, ...] = ()
+
     def __init__(self, dut) -> None:
         self.dut = dut
         self.detects: Optional[ThreatModel] = None
 
+        # Instances of the IP driven by the same stimulus, see
+        # runner.run_multi_tests, each with its own parameters, which are
+        # also given for the parameters set at runtime, see runner.run_tests
+        self.multi: bool = dut._name.endswith(MULTI_SUFFIX)
+        self.parameter_sets: List[Dict[str, int]] = [{}]
+
+        if "ASPYCOT_PARAMETER_SETS" in os.environ:
+            self.parameter_sets = json.loads(os.environ["ASPYCOT_PARAMETER_SETS"])
+        elif cocotb.simulator.is_running():
+            self.parameter_sets = [
+                {name: int(getattr(cocotb.top, name)) for name in self.parameters}
+            ]
+
+    @property
+    def instances(self) -> int:
+        return len(self.parameter_sets)
+
+    def label(self, instance: int) -> str:
+        """Prefix of the messages about an instance, if there are several"""
+        if not self.multi:
+            return ""
+        values = " ".join(f"{k}={v}" for k, v in self.parameter_sets[instance].items())
+        return f"{values}: "
+
+    def output(self, name: str, instance: int = 0) -> Any:
+        """Output port name of an instance of the IP"""
+        return getattr(self.dut, f"{name}_{instance}" if self.multi else name)
+
     @abstractmethod
     async def init(self) -> None:
         pass
@@ -21,11 +55,30 @@ class Wrapper(ABC):
         pass
 
     @abstractmethod
-    async def execute_instr(self, instr: Instruction) -> None:
+    def stimulus(self, instr: Instruction) -> Hashable:
+        """Values driven on the inputs of the IP to execute instr"""
+        pass
+
+    def can_raise(self, stimulus: Hashable) -> bool:
+        """Whether an exception may rise after a cycle driving stimulus.
+
+        Runs of cycles that cannot raise one are executed with a single
+        await, see stimulus.get_runs. By default every cycle may.
+
+        """
+        return True
+
+    @abstractmethod
+    async def execute_run(self, stimulus: Hashable, cycles: int) -> None:
+        """Drive stimulus on the inputs of the IP for cycles clock cycles"""
         pass
 
+    async def execute_instr(self, instr: Instruction) -> None:
+        await self.execute_run(self.stimulus(instr), 1)
+
     @abstractmethod
-    async def raised_exception(self) -> bool:
+    def exceptions(self, instance: int = 0) -> List[Any]:
+        """Exception signals of an instance of the IP, watched by the oracle"""
         pass
 
     def can_detect(self, model: ThreatModel) -> bool:
@@ -33,16 +86,13 @@ class Wrapper(ABC):
 
 
 class JOPAlarm(Wrapper):
+    parameters = ("JopThreshold", "StepUpValue", "StepDownValue")
+
     def __init__(self, dut) -> None:
         super().__init__(dut)
 
         self.detects = ThreatModel.JOP
 
-        if cocotb.simulator.is_running():
-            self.JopThreshold = int(cocotb.top.JopThreshold)
-            self.StepUpValue = int(cocotb.top.StepUpValue)
-            self.StepDownValue = int(cocotb.top.StepDownValue)
-
     async def init(self) -> None:
         """Initialize input signals value"""
 
@@ -63,16 +113,23 @@ class JOPAlarm(Wrapper):
 
         assert self.dut.rst_ni.value == 1, f"{self.dut.name} is still under reset"
 
-    async def execute_instr(self, instr: Instruction) -> None:
+    def stimulus(self, instr: Instruction) -> int:
+        return instr.is_jr()
+
+    def can_raise(self, stimulus: int) -> bool:
+        # The counter only increases on indirect jumps
+        return stimulus == 1
+
+    async def execute_run(self, stimulus: int, cycles: int) -> None:
         """Initialize input signals value"""
 
         self.dut.instr_valid_i.value = 1
-        self.dut.is_ind_jump_i.value = instr.is_jr()
+        self.dut.is_ind_jump_i.value = stimulus
 
-        await RisingEdge(self.dut.clk_i)
+        await ClockCycles(self.dut.clk_i, cycles)
 
-    async def raised_exception(self) -> bool:
-        return self.dut.alarm_o.value == 1
+    def exceptions(self, instance: int = 0) -> List[Any]:
+        return [self.output("alarm_o", instance)]
 
     def can_detect(self, model: ThreatModel) -> bool:
         return self.detects == model
@@ -83,7 +140,7 @@ def wrap(dut) -> Wrapper:
     supported_ips: Dict[str, Type[Wrapper]] = {
         "jop_alarm": JOPAlarm,
     }
-    ip: str = dut._name
+    ip: str = get_ip(dut._name)
     try:
         return supported_ips[ip](dut)
     except KeyError: